@@ -12,6 +12,7 @@
 # All configuration values have a default; values that are commented out
 # serve to show the default.
 
+import ast
 import sys
 import os
 # import shlex
@@ -92,13 +93,15 @@ author = u'Nader Morshed'
 # built documents.
 #
 # The short X.Y version.
-version = [
-    line.split("=", 1)[1][1:]
-    for line in open(
-        os.path.join(THIS_DIR, "..", "pycamv", "version.py")
+with open(os.path.join(THIS_DIR, "..", "pycamv", "version.py")) as f:
+    version = next(
+        ast.literal_eval(node.value)
+        for node in ast.parse(f.read()).body
+        if isinstance(node, ast.Assign) and any(
+            getattr(target, "id", None) == "__version__"
+            for target in node.targets
+        )
     )
-    if line.startswith("__version__ =")
-][0]
 # The full version, including alpha/beta/rc tags.
 release = version
 
@@ -2,8 +2,6 @@
 pycamv is a Python package for validating proteomics data.
 """
 
-from __future__ import absolute_import, division
-
 from .version import __version__
 from . import camv_mat
 
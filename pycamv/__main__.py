@@ -2,8 +2,6 @@
 Main module for running pycamv from the commandline.
 """
 
-from __future__ import absolute_import, division
-
 import multiprocessing
 import sys
 
@@ -3,8 +3,6 @@ Provides functionality for exporting processed data to .camv files (JSON
 format).
 """
 
-from __future__ import absolute_import, division
-
 import errno
 import logging
 import os
@@ -15,6 +13,16 @@ from . import sql
 
 LOGGER = logging.getLogger("pycamv.export")
 
+SENTINEL = None
+"""
+Queue item marking that no more batches will be sent to export_to_sql.
+"""
+
+COMMIT_SIZE = 1000
+"""
+Number of exported peptide-spectrum matches written per transaction.
+"""
+
 
 def _extract_pep_seq(sequence):
     return "".join(
@@ -33,8 +41,8 @@ def _extract_mods(sequence):
 
 def _pep_mod_name(pep_seq, mods):
     return "".join(
-        letter.lower() if mods else letter.upper()
-        for letter, mods in zip(pep_seq, mods[1:-1])
+        letter.lower() if mods[index + 1] else letter.upper()
+        for index, letter in enumerate(pep_seq)
     )
 
 
@@ -54,19 +62,25 @@ def export_to_sql(
     db = sqlite3.connect(out_path, isolation_level="EXCLUSIVE")
     cursor = db.cursor()
 
+    sql.init_db(cursor)
     sql.create_tables(cursor)
     sql.run_migrations(cursor)
 
     sql.insert_path_data(cursor, search_path, raw_paths)
 
+    id_cache = sql.IdCache()
+    fragment_rows = []
     total = time()
 
-    # frag_map = defaultdict(list)
-    index = 1
-    while index <= total_num_seq:
-        index += 1
-        item = queue.get()
+    # Results arrive in batches, terminated by SENTINEL
+    index = 0
+    items = (
+        item
+        for batch in iter(queue.get, SENTINEL)
+        for item in batch
+    )
 
+    for index, item in enumerate(items, 1):
         if item:
             pep_query, seq, choice, peaks, precursor_win, label_win = item
         else:
@@ -82,31 +96,38 @@ def export_to_sql(
                     _extract_mods(seq),
                 ),
                 "- {}".format(choice) if choice else "",
-                "({} / {})".format(index - 1, total_num_seq)
+                "({} / {})".format(index, total_num_seq)
                 if total_num_seq else
-                "(# {})".format(index - 1),
+                "(# {})".format(index),
             )
         )
 
         # Protein
-        protein_ids = sql.insert_protein(cursor, pep_query)
+        protein_ids = sql.insert_protein(
+            cursor, pep_query, id_cache=id_cache,
+        )
         protein_set_id = sql.insert_protein_set(cursor, pep_query)
 
         # Peptide
-        peptide_id = sql.insert_peptide(cursor, pep_query, protein_set_id)
+        peptide_id = sql.insert_peptide(
+            cursor, pep_query, protein_set_id, id_cache=id_cache,
+        )
         sql.insert_pep_prot(
             cursor,
             peptide_id, protein_ids,
             pep_query.pep_offsets,
+            id_cache=id_cache,
         )
 
         # Modification data
         mod_state_id = sql.insert_mod_state(cursor, pep_query, peptide_id)
-        ptm_id = sql.insert_ptm(cursor, pep_query, seq, mod_state_id)
+        ptm_id = sql.insert_ptm(
+            cursor, pep_query, seq, mod_state_id, id_cache=id_cache,
+        )
 
         # Scan header data
         quant_mz_id = sql.insert_quant_mz(cursor, pep_query)
-        file_id = sql.insert_file(cursor, pep_query)
+        file_id = sql.insert_file(cursor, pep_query, id_cache=id_cache)
         scan_id = sql.insert_scans(
             cursor, pep_query, scan_query,
             quant_mz_id,
@@ -130,16 +151,27 @@ def export_to_sql(
             cursor, pep_query, scan_id, ptm_id,
             choice=choice,
         )
-        sql.insert_fragments(cursor, peaks, scan_ptm_id)
+        # Fragments are written in bulk with each commit
+        fragment_rows.extend(sql.get_fragment_rows(peaks, scan_ptm_id))
+
+        if index % COMMIT_SIZE == 0:
+            sql.insert_fragment_rows(cursor, fragment_rows)
+            fragment_rows = []
+            db.commit()
 
-        db.commit()
         LOGGER.debug(
             "done - avg: {:.3f} sec".format((time() - total) / index)
         )
 
     LOGGER.debug(
         "total: {:.3f} min ({:.3f} sec / peptide)"
-        .format((time() - total) / 60, (time() - total) / (index + 1))
+        .format((time() - total) / 60, (time() - total) / max(index, 1))
     )
 
+    sql.insert_fragment_rows(cursor, fragment_rows)
+    db.commit()
+
+    sql.create_indexes(cursor)
     db.close()
+
+    return index
@@ -1,21 +1,44 @@
 
 import logging
+import struct
+import zlib
 
 from pycamv import version
 
 LOGGER = logging.getLogger("pycamv.migrations")
 
+MIGRATION_BATCH_SIZE = 1000
+
 
 def run_migrations(from_version, to_version, cursor):
-    if from_version == "1.0.0":
-        if to_version == "1.1.0":
-            return migrate_1_0_0_to_1_1_0(cursor)
+    while from_version != to_version:
+        if from_version not in MIGRATIONS:
+            raise NotImplementedError(
+                "Unable to migrate CAMV data from {} to {}".format(
+                    from_version, to_version,
+                )
+            )
 
-    raise NotImplementedError(
-        "Unable to migrate CAMV data from {} to {}".format(
-            from_version, to_version,
-        )
+        from_version, migrate = MIGRATIONS[from_version]
+        migrate(cursor)
+
+
+def _update_data_version(cursor, data_version):
+    cursor.executemany(
+        """
+        UPDATE camv_meta
+        SET val=(?)
+        WHERE key=(?)
+        """,
+        [
+            (i[1], i[0])
+            for i in {
+                "pycamverterVersion": version.__version__,
+                "camvDataVersion": data_version,
+            }.items()
+        ]
     )
+    cursor.connection.commit()
 
 
 def migrate_1_0_0_to_1_1_0(cursor):
@@ -32,18 +55,66 @@ def migrate_1_0_0_to_1_1_0(cursor):
     ALTER TABLE peptides ADD COLUMN protein_set_offsets text;
     """)
     cursor.connection.commit()
-    cursor.executemany(
-        """
-        UPDATE camv_meta
-        SET val=(?)
-        WHERE key=(?)
-        """,
-        [
-            (i[1], i[0])
-            for i in {
-                "pycamverterVersion": version.__version__,
-                "camvDataVersion": "1.1.0",
-            }.items()
-        ]
+    _update_data_version(cursor, "1.1.0")
+
+
+def _text_blob_to_binary(blob):
+    values = [
+        float(val)
+        for peak in bytes(blob).decode("utf-8").split(";")
+        if peak
+        for val in peak.split(",")
+    ]
+    return zlib.compress(
+        struct.pack("<{}f".format(len(values)), *values), 1,
     )
+
+
+def migrate_1_1_0_to_1_2_0(cursor):
+    LOGGER.info("Migrating data from 1.1.0 to 1.2.0")
+
+    cursor.executescript("""
+    ALTER TABLE scan_data ADD COLUMN data_encoding text;
+    """)
+
+    # Peak blobs changed from "mz,intensity;..." text to zlib-compressed,
+    # packed float32 pairs. Rows are converted a batch at a time, so that
+    # large databases are never held in memory at once.
+    last_id = -1
+
+    while True:
+        rows = cursor.execute(
+            """
+            SELECT data_id, data_blob
+            FROM scan_data
+            WHERE data_id > (?) AND data_blob IS NOT NULL
+            ORDER BY data_id
+            LIMIT (?)
+            """,
+            (last_id, MIGRATION_BATCH_SIZE),
+        ).fetchall()
+
+        if not rows:
+            break
+
+        cursor.executemany(
+            """
+            UPDATE scan_data
+            SET data_blob=(?), data_encoding='zlib'
+            WHERE data_id=(?)
+            """,
+            [
+                (_text_blob_to_binary(data_blob), data_id)
+                for data_id, data_blob in rows
+            ],
+        )
+        last_id = rows[-1][0]
+
     cursor.connection.commit()
+    _update_data_version(cursor, "1.2.0")
+
+
+MIGRATIONS = {
+    "1.0.0": ("1.1.0", migrate_1_0_0_to_1_1_0),
+    "1.1.0": ("1.2.0", migrate_1_1_0_to_1_2_0),
+}
@@ -1,6 +1,9 @@
 
 import logging
-import sqlite3
+import struct
+import zlib
+
+from functools import lru_cache
 
 from . import migrations
 from pycamv import regexes, utils, version
@@ -9,14 +12,22 @@ from pycamv.fragment import gen_sequences, ms_labels
 LOGGER = logging.getLogger("pycamv.sql")
 
 DB_EXTS = [".db", ".sql"]
-DATA_VERSION = "1.1.0"
+DATA_VERSION = "1.2.0"
+BLOB_ENCODING = "zlib"
+MAX_SQL_VARIABLES = 999
 
-CAMV_SCHEMA = """
+CAMV_PRAGMAS = """
+-- page_size only takes effect before the first table is created
+PRAGMA page_size = 32768;
 PRAGMA foreign_keys = ON;
 PRAGMA journal_mode = OFF;
 PRAGMA synchronous = OFF;
 PRAGMA temp_store = MEMORY;
+PRAGMA cache_size = -131072;
+PRAGMA mmap_size = 1073741824;
+"""
 
+CAMV_SCHEMA = """
 -- Individual protein names (i.e. Src)
 CREATE TABLE IF NOT EXISTS proteins
 (
@@ -98,6 +109,7 @@ CREATE TABLE IF NOT EXISTS scan_data
     scan_id                 integer not null,
     data_type               text,
     data_blob               blob,
+    data_encoding           text,
     FOREIGN KEY(scan_id) REFERENCES scans(scan_id),
     UNIQUE(scan_id, data_type)
 );
@@ -167,8 +179,6 @@ CREATE TABLE IF NOT EXISTS fragments
     FOREIGN KEY(scan_ptm_id) REFERENCES scan_ptms(scan_ptm_id)
     UNIQUE(peak_id, scan_ptm_id, name)
 );
-CREATE INDEX IF NOT EXISTS fragments_idx ON fragments(scan_ptm_id);
-CREATE INDEX IF NOT EXISTS fragments_idx ON fragments(peak_id, scan_ptm_id);
 
 CREATE TABLE IF NOT EXISTS camv_meta
 (
@@ -178,6 +188,17 @@ CREATE TABLE IF NOT EXISTS camv_meta
 );
 """
 
+# Built once all rows are loaded, rather than updated on every insert.
+# (peak_id, scan_ptm_id) lookups are already covered by the fragments
+# UNIQUE constraint.
+CAMV_INDEXES = """
+CREATE INDEX IF NOT EXISTS fragments_idx ON fragments(scan_ptm_id);
+"""
+
+
+def init_db(cursor):
+    cursor.executescript(CAMV_PRAGMAS)
+
 
 def create_tables(cursor):
     cursor.executescript(CAMV_SCHEMA)
@@ -185,6 +206,10 @@ def create_tables(cursor):
     cursor.connection.commit()
 
 
+def create_indexes(cursor):
+    cursor.executescript(CAMV_INDEXES)
+
+
 def run_migrations(cursor):
     rows = cursor.execute(
         """
@@ -216,6 +241,53 @@ def run_migrations(cursor):
         migrations.run_migrations(camv_data_version, DATA_VERSION, cursor)
 
 
+class IdCache:
+    """
+    In-process map of row keys to ids for rows already written in this
+    session, used to skip the database round trip for repeated proteins,
+    peptides, PTMs, and files.
+
+    Each key maps to the row's id and the column values last written for it.
+
+    Attributes
+    ----------
+    proteins : dict of str, tuple of (int, dict)
+    peptides : dict of str, tuple of (int, dict)
+    pep_prots : dict of tuple of (int, int), tuple of (int, dict)
+    ptms : dict of tuple of (int, str), tuple of (int, dict)
+    files : dict of str, tuple of (int, dict)
+    """
+    def __init__(self):
+        self.proteins = {}
+        self.peptides = {}
+        self.pep_prots = {}
+        self.ptms = {}
+        self.files = {}
+
+
+def _cached_row_id(
+    id_cache, cache_name, key, cursor, table, id, data,
+    unique_on=None, update=False,
+):
+    if id_cache is not None:
+        cached = getattr(id_cache, cache_name).get(key)
+
+        # Updated rows keep the last values written for their key, only skip
+        # the database when those values have not changed
+        if cached is not None and (not update or cached[1] == data):
+            return cached[0]
+
+    row_id = _insert_or_update_row(
+        cursor, table, id, data,
+        unique_on=unique_on, update=update,
+    )
+
+    if id_cache is not None and row_id is not None:
+        getattr(id_cache, cache_name)[key] = (row_id, data)
+
+    return row_id
+
+
 def _insert_or_update_row(
     cursor, table, id, data,
     unique_on=None, update=False,
@@ -223,6 +295,24 @@ def _insert_or_update_row(
     if unique_on is None:
         unique_on = list(data.keys())
 
+    # Most rows are new on a fresh import, only look up the existing row's id
+    # when the insert hits a unique constraint
+    cursor.execute(
+        """
+        INSERT OR IGNORE INTO {}
+        ({})
+        VALUES ({})
+        """.format(
+            table,
+            ", ".join(data.keys()),
+            ",".join("?" for i in data.keys()),
+        ),
+        list(data.values()),
+    )
+
+    if cursor.rowcount > 0:
+        return cursor.lastrowid
+
     row_id = None
 
     for row in cursor.execute(
@@ -239,21 +329,7 @@ def _insert_or_update_row(
     ):
         row_id = row[0]
 
-    if row_id is None:
-        cursor.execute(
-            """
-            INSERT OR IGNORE INTO {}
-            ({})
-            VALUES ({})
-            """.format(
-                table,
-                ", ".join(data.keys()),
-                ",".join("?" for i in data.keys()),
-            ),
-            list(data.values()),
-        )
-        row_id = cursor.lastrowid
-    elif update:
+    if row_id is not None and update:
         keys = [i for i in data.keys() if i not in unique_on]
         cursor.execute(
             """
@@ -271,9 +347,10 @@ def _insert_or_update_row(
     return row_id
 
 
-def insert_protein(cursor, query):
+def insert_protein(cursor, query, id_cache=None):
     return [
-        _insert_or_update_row(
+        _cached_row_id(
+            id_cache, "proteins", access,
             cursor, "proteins", "protein_id",
             {
                 "protein_name": prot_desc,
@@ -318,8 +395,9 @@ def insert_protein_set(cursor, query):
     )
 
 
-def insert_peptide(cursor, query, prot_set_id):
-    return _insert_or_update_row(
+def insert_peptide(cursor, query, prot_set_id, id_cache=None):
+    return _cached_row_id(
+        id_cache, "peptides", query.pep_seq,
         cursor, "peptides", "peptide_id",
         {
             "peptide_seq": query.pep_seq,
@@ -332,14 +410,15 @@ def insert_peptide(cursor, query, prot_set_id):
                 )
             ),
         },
-        unique_on=["peptide_seq", "protein_set_id"],
+        unique_on=["peptide_seq"],
         update=True,
     )
 
 
-def insert_pep_prot(cursor, pep_id, prot_ids, prot_offsets):
+def insert_pep_prot(cursor, pep_id, prot_ids, prot_offsets, id_cache=None):
     return [
-        _insert_or_update_row(
+        _cached_row_id(
+            id_cache, "pep_prots", (pep_id, prot_id),
             cursor, "protein_peptide", "prot_pep_id",
             {
                 "peptide_id": pep_id,
@@ -356,25 +435,31 @@ def insert_pep_prot(cursor, pep_id, prot_ids, prot_offsets):
     ]
 
 
-def _get_labels_mz(query):
-    def _within(val, bounds):
-        return val >= bounds[0] and val <= bounds[1]
-    return [
-        (mz, name)
-        for mod in set(query.get_label_mods)
-        for mz, name in zip(
-            ms_labels.LABEL_MASSES.get(mod, []),
-            ms_labels.LABEL_NAMES.get(mod, []),
+def _get_labels_mz(label_mods):
+    labels_mz = []
+
+    for mod in label_mods:
+        low, high = ms_labels.LABEL_MZ_WINDOW.get(
+            mod, (float("-inf"), float("inf")),
+        )
+        labels_mz.extend(
+            (mz, name)
+            for mz, name in zip(
+                ms_labels.LABEL_MASSES.get(mod, []),
+                ms_labels.LABEL_NAMES.get(mod, []),
+            )
+            if low <= mz <= high
         )
-        if _within(mz, ms_labels.LABEL_MZ_WINDOW.get(mod, [mz, mz]))
-    ]
+
+    return labels_mz
 
 
 def insert_quant_mz(cursor, query):
+    label_mods = set(query.get_label_mods)
     quant_mz_id = _insert_or_update_row(
         cursor, "quant_mz", "quant_mz_id",
         {
-            "label_name": ";".join(sorted(set(query.get_label_mods))),
+            "label_name": ";".join(sorted(label_mods)),
         },
     )
 
@@ -394,15 +479,16 @@ def insert_quant_mz(cursor, query):
                 mz,
                 name
             )
-            for mz, name in _get_labels_mz(query)
+            for mz, name in _get_labels_mz(label_mods)
         ],
     )
 
     return quant_mz_id
 
 
-def insert_file(cursor, query):
-    return _insert_or_update_row(
+def insert_file(cursor, query, id_cache=None):
+    return _cached_row_id(
+        id_cache, "files", query.filename,
         cursor, "files", "file_id",
         {
             "filename": query.filename,
@@ -411,17 +497,31 @@ def insert_file(cursor, query):
 
 
 def _peaks_to_blob(peaks):
-    return sqlite3.Binary(
-        ";".join(
-            "{},{}".format(
-                i.mz if hasattr(i, "mz") else i[0],
-                i.intensity if hasattr(i, "intensity") else i[1],
-            )
-            for i in peaks
-        ).encode("utf-8")
+    # Peaks are stored as zlib-compressed, little-endian float32
+    # (mz, intensity) pairs
+    values = [
+        val
+        for i in peaks
+        for val in (
+            i.mz if hasattr(i, "mz") else i[0],
+            i.intensity if hasattr(i, "intensity") else i[1],
+        )
+    ]
+    return zlib.compress(
+        struct.pack("<{}f".format(len(values)), *values), 1,
     )
 
 
+def _blob_to_peaks(blob, encoding=BLOB_ENCODING):
+    blob = bytes(blob)
+
+    if encoding == "zlib":
+        blob = zlib.decompress(blob)
+
+    values = struct.unpack("<{}f".format(len(blob) // 4), blob)
+    return list(zip(values[::2], values[1::2]))
+
+
 def insert_peaks(cursor, peaks, scan_id):
     return _insert_or_update_row(
         cursor, "scan_data", "data_id",
@@ -429,6 +529,7 @@ def insert_peaks(cursor, peaks, scan_id):
             "scan_id": scan_id,
             "data_type": "ms2",
             "data_blob": _peaks_to_blob(peaks),
+            "data_encoding": BLOB_ENCODING,
         },
         unique_on=["scan_id", "data_type"],
     )
@@ -441,6 +542,7 @@ def insert_precursor_peaks(cursor, scan_query, precursor_win, scan_id):
             "scan_id": scan_id,
             "data_type": "precursor",
             "data_blob": _peaks_to_blob(precursor_win),
+            "data_encoding": BLOB_ENCODING,
         },
         unique_on=["scan_id", "data_type"],
     )
@@ -453,6 +555,7 @@ def insert_quant_peaks(cursor, query, label_win, scan_id):
             "scan_id": scan_id,
             "data_type": "quant",
             "data_blob": _peaks_to_blob(label_win),
+            "data_encoding": BLOB_ENCODING,
         },
         unique_on=["scan_id", "data_type"],
     )
@@ -498,6 +601,7 @@ def insert_scan_ptms(cursor, query, scan_id, ptm_id, choice=None):
     )
 
 
+@lru_cache(maxsize=1 << 12)
 def _get_mods_description(pep_seq, mod_state):
     return ("+ " if mod_state else "") + " - ".join(
         "{} {}{}".format(count, mod[0].lower(), "".join(letters))
@@ -525,22 +629,23 @@ def insert_mod_state(cursor, query, peptide_id):
 
 def _pep_mod_name(pep_seq, mods):
     return "".join(
-        letter.lower() if mods else letter.upper()
-        for letter, mods in zip(pep_seq, mods[1:-1])
+        letter.lower() if mods[index + 1] else letter.upper()
+        for index, letter in enumerate(pep_seq)
     )
 
 
+def _mods_suffix(mods):
+    return " ({})".format(",".join(mods)) if mods else ""
+
+
 def _pep_mod_full_name(pep_seq, mods):
-    return "-".join(
-        letter + (
-            " ({})".format(",".join(mods))
-            if mods else
-            ""
-        )
-        for letter, mods in zip(
-            ["N-term"] + list(pep_seq) + ["C-term"],
-            mods,
-        )
+    return "N-term{}-{}-C-term{}".format(
+        _mods_suffix(mods[0]),
+        "-".join(
+            letter + _mods_suffix(mods[index + 1])
+            for index, letter in enumerate(pep_seq)
+        ),
+        _mods_suffix(mods[-1]),
     )
 
 
@@ -551,32 +656,92 @@ def _extract_mods(sequence):
     )
 
 
-def insert_ptm(cursor, query, seq, mod_state_id):
+def insert_ptm(cursor, query, seq, mod_state_id, id_cache=None):
     mods = _extract_mods(seq)
-    return _insert_or_update_row(
+    full_name = _pep_mod_full_name(query.pep_seq, mods)
+    return _cached_row_id(
+        id_cache, "ptms", (mod_state_id, full_name),
         cursor, "ptms", "ptm_id",
         {
             "mod_state_id": mod_state_id,
             "name": _pep_mod_name(query.pep_seq, mods),
-            "full_name": _pep_mod_full_name(query.pep_seq, mods),
+            "full_name": full_name,
         },
         unique_on=["mod_state_id", "full_name"],
     )
 
 
+ION_TYPES = {
+    "a": "b",
+    "b": "b",
+    "c": "b",
+    "x": "y",
+    "y": "y",
+    "z": "y",
+}
+
+
+_RE_BY_ION_POS = regexes.RE_BY_ION_POS
+
+
+@lru_cache(maxsize=1 << 16)
 def _ion_type_pos(name):
-    name_match = regexes.RE_BY_ION_POS.match(name)
+    name_match = _RE_BY_ION_POS.match(name)
     if name_match:
         ion_pos = int(name_match.group(2))
-        ion_type = "b" if name_match.group(1) in "abc" else "y"
+        ion_type = ION_TYPES[name_match.group(1)]
     else:
         ion_type, ion_pos = None, None
 
     return ion_type, ion_pos
 
 
-def insert_fragments(cursor, peaks, scan_ptm_id):
-    gen = (
+FRAGMENT_COLUMNS = (
+    "scan_ptm_id",
+    "peak_id",
+    "name",
+    "display_name",
+    "mz",
+    "intensity",
+    "best",
+    "ion_type",
+    "ion_pos",
+)
+
+
+def _insert_rows(cursor, table, columns, rows):
+    # Insert several rows per statement, staying under SQLite's default
+    # limit of 999 bound parameters
+    batch_size = max(1, MAX_SQL_VARIABLES // len(columns))
+    prefix = "INSERT OR IGNORE INTO {} ({}) VALUES ".format(
+        table,
+        ", ".join(columns),
+    )
+    placeholder = "({})".format(", ".join("?" for _ in columns))
+
+    for start in range(0, len(rows), batch_size):
+        batch = rows[start:start + batch_size]
+        cursor.execute(
+            prefix + ", ".join(placeholder for _ in batch),
+            [val for row in batch for val in row],
+        )
+
+
+def get_fragment_rows(peaks, scan_ptm_id):
+    """
+    Build the fragments table rows for a scan's peak assignments.
+
+    Parameters
+    ----------
+    peaks : list of :class:`PeptideHit<pycamv.compare.PeptideHit>`
+    scan_ptm_id : int
+
+    Returns
+    -------
+    list of tuple
+        Rows with values ordered as in :data:`FRAGMENT_COLUMNS`.
+    """
+    return [
         (
             scan_ptm_id,
             peak_index,
@@ -589,24 +754,15 @@ def insert_fragments(cursor, peaks, scan_ptm_id):
         for peak_index, peak_hit in enumerate(peaks)
         if peak_hit.match_list
         for name, (mz, _) in peak_hit.match_list.items()
-    )
-    cursor.executemany(
-        """
-        INSERT OR IGNORE INTO fragments
-        (
-            scan_ptm_id,
-            peak_id,
-            name,
-            display_name,
-            mz,
-            intensity,
-            best,
-            ion_type,
-            ion_pos
-        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """,
-        gen,
-    )
+    ]
+
+
+def insert_fragment_rows(cursor, rows):
+    _insert_rows(cursor, "fragments", FRAGMENT_COLUMNS, rows)
+
+
+def insert_fragments(cursor, peaks, scan_ptm_id):
+    insert_fragment_rows(cursor, get_fragment_rows(peaks, scan_ptm_id))
 
 
 def insert_camv_meta(cursor):
@@ -1,3 +1,4 @@
 from . import (
-    compare, fragments, gen_sequences, losses, masses, ms_labels, validate
+    compare, frag_cache, fragments, gen_sequences, losses, masses, ms_labels,
+    validate,
 )
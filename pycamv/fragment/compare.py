@@ -3,8 +3,12 @@ This module provides functionality for comparing spectra with a list of
 fragments.
 """
 
-from __future__ import absolute_import, division
+import numpy as np
 
+try:
+    from numba import njit
+except ImportError:
+    njit = None
 
 MS_TOL = 10
 CID_TOL = 1000
@@ -61,6 +65,64 @@ def _calculate_ion_score(ion_name):
     return score
 
 
+def _match_peaks(frag_mzs, peak_mzs, tol):
+    # Both inputs are sorted by m/z, sweep a window over the fragment ions
+    # and return the [start, stop) range of ions within tol of each peak
+    thresh = 1.5 * tol
+    num_frags = len(frag_mzs)
+    starts = np.zeros(len(peak_mzs), dtype=np.int64)
+    stops = np.zeros(len(peak_mzs), dtype=np.int64)
+    start = 0
+
+    for index in range(len(peak_mzs)):
+        mz = peak_mzs[index]
+
+        # non-abs ppm should be monoisotopically increasing around mz
+        while (
+            start < num_frags and
+            1e6 * (frag_mzs[start] - mz) / frag_mzs[start] <= -thresh
+        ):
+            start += 1
+
+        stop = start
+
+        while (
+            stop < num_frags and
+            1e6 * (frag_mzs[stop] - mz) / frag_mzs[stop] < thresh
+        ):
+            stop += 1
+
+        starts[index] = start
+        stops[index] = stop
+
+    return starts, stops
+
+
+def _search_peaks(frag_mzs, peak_mzs, tol):
+    # Vectorized equivalent of _match_peaks: solve the ppm bounds for the
+    # fragment m/z and binary search every peak at once
+    ratio = 1.5 * tol / 1e6
+    starts = np.searchsorted(frag_mzs, peak_mzs / (1 + ratio), side="right")
+    stops = np.searchsorted(frag_mzs, peak_mzs / (1 - ratio), side="left")
+
+    return starts, np.maximum(starts, stops)
+
+
+if njit is not None:
+    _match_peaks = njit(cache=True)(_match_peaks)
+else:
+    _match_peaks = _search_peaks
+
+
+def warm_up():
+    """
+    Compile any JIT kernels, so that forked worker processes inherit them
+    rather than each compiling their own.
+    """
+    if njit is not None:
+        _match_peaks(np.ones(2), np.ones(2), HCD_TOL)
+
+
 def compare_spectra(
     spectra, frag_ions,
     tol=None,
@@ -88,31 +150,23 @@ def compare_spectra(
     # Sort frag ions, so we only calculate ppms on peaks local to that area
     # of the spectrum
     frag_ions = list(sorted(frag_ions.items(), key=lambda x: x[1]))
-    last_frag_index = 0
-    last_mz = 0
 
     # Reprofiled Peaks? Centroided Peaks?
-    for mz, intensity in spectra.centroidedPeaks:
-        assert mz >= last_mz
-        last_mz = mz
-
-        peak_candidates = {}
-        min_index_set = False
-
-        for index, (ion_name, ion_mz) in enumerate(
-            frag_ions[last_frag_index:]
-        ):
-            # non-abs ppm should be monoisotopically increasing around mz
-            ppm = 1e6 * (ion_mz - mz) / ion_mz
-
-            if abs(ppm) < 1.5 * tol:
-                peak_candidates[ion_name] = ion_mz, abs(ion_mz - mz)
-
-                if not min_index_set:
-                    last_frag_index = index
-                    min_index_set = True
-            elif ppm > 1.5 * tol:
-                break
+    peaks = spectra.centroidedPeaks
+    peak_mzs = np.fromiter((mz for mz, _ in peaks), dtype=np.float64)
+    assert (np.diff(peak_mzs) >= 0).all()
+
+    starts, stops = _match_peaks(
+        np.fromiter((mz for _, mz in frag_ions), dtype=np.float64),
+        peak_mzs,
+        tol,
+    )
+
+    for (mz, intensity), start, stop in zip(peaks, starts, stops):
+        peak_candidates = {
+            ion_name: (ion_mz, abs(ion_mz - mz))
+            for ion_name, ion_mz in frag_ions[start:stop]
+        }
 
         # peak_candidates = {
         #     ion_name: (ion_mz, abs(ion_mz - mz))
@@ -0,0 +1,208 @@
+"""
+This module provides an on-disk cache of fragment ions, so that peptides
+fragmented in one run are not recalculated in the next.
+
+The cache has no size limit, and entries grow with peptide length. Use
+:meth:`FragmentCache.clear` or delete the cache file to reclaim that space.
+"""
+
+import logging
+import os
+import pickle
+import sqlite3
+
+
+LOGGER = logging.getLogger("pycamv.frag_cache")
+
+CACHE_DIR = os.path.join(
+    os.environ.get("XDG_CACHE_HOME") or
+    os.path.join(os.path.expanduser("~"), ".cache"),
+    "pycamv",
+)
+DEFAULT_PATH = os.path.join(CACHE_DIR, "fragments.db")
+
+# Fixed, so that cached values can be read by any supported Python
+PICKLE_PROTOCOL = 4
+
+# Bump whenever fragment_ions output changes (masses, losses, ion types, or
+# the format of the cached values). Caches written with any other value are
+# cleared when opened.
+FRAG_CACHE_SCHEMA = "1"
+
+CACHE_SCHEMA = """
+PRAGMA journal_mode = WAL;
+PRAGMA synchronous = NORMAL;
+
+CREATE TABLE IF NOT EXISTS fragment_ions
+(
+    key                     text primary key not null,
+    val                     blob not null
+);
+
+CREATE TABLE IF NOT EXISTS cache_meta
+(
+    key                     text primary key not null,
+    val                     text
+);
+"""
+
+
+class FragmentCache:
+    """
+    Persistent map of :func:`fragment_ions
+    <pycamv.fragment.fragments.fragment_ions>` arguments to their ions.
+
+    Entries are cleared whenever the cache was written with a different
+    :data:`FRAG_CACHE_SCHEMA`, in case masses or losses have changed.
+
+    Attributes
+    ----------
+    path : str
+    """
+    def __init__(self, path=None):
+        self.path = path or DEFAULT_PATH
+        self._db = None
+        self._pid = None
+
+    def _connect(self):
+        # sqlite connections cannot be shared with forked workers, each
+        # process opens its own
+        if self._db is not None and self._pid == os.getpid():
+            return self._db
+
+        dirname = os.path.dirname(self.path)
+
+        if dirname and not os.path.isdir(dirname):
+            os.makedirs(dirname, exist_ok=True)
+
+        db = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+        db.executescript(CACHE_SCHEMA)
+
+        row = db.execute(
+            "SELECT val FROM cache_meta WHERE key='fragCacheSchema'"
+        ).fetchone()
+
+        if row is None or row[0] != FRAG_CACHE_SCHEMA:
+            LOGGER.debug(
+                "Clearing fragment cache {} from schema {}"
+                .format(self.path, row[0] if row else None)
+            )
+            self._clear(db)
+
+        self._db = db
+        self._pid = os.getpid()
+
+        return db
+
+    @staticmethod
+    def _clear(db):
+        with db:
+            db.execute("BEGIN")
+            db.execute("DELETE FROM fragment_ions")
+            db.execute(
+                "INSERT OR REPLACE INTO cache_meta (key, val) VALUES (?, ?)",
+                ["fragCacheSchema", FRAG_CACHE_SCHEMA],
+            )
+
+        db.execute("VACUUM")
+
+    def clear(self):
+        """
+        Remove all cached values and reclaim their disk space.
+        """
+        self._clear(self._connect())
+
+    def get(self, key):
+        """
+        Look up a cached value.
+
+        Parameters
+        ----------
+        key : tuple
+
+        Returns
+        -------
+        object or None
+        """
+        try:
+            row = self._connect().execute(
+                "SELECT val FROM fragment_ions WHERE key=?",
+                [repr(key)],
+            ).fetchone()
+        except sqlite3.Error as err:
+            LOGGER.debug("Unable to read fragment cache: {}".format(err))
+            return None
+
+        return pickle.loads(row[0]) if row else None
+
+    def put(self, key, val):
+        """
+        Store a value, ignoring keys that are already cached.
+
+        Parameters
+        ----------
+        key : tuple
+        val : object
+        """
+        try:
+            self._connect().execute(
+                "INSERT OR IGNORE INTO fragment_ions (key, val) VALUES (?, ?)",
+                [repr(key), pickle.dumps(val, protocol=PICKLE_PROTOCOL)],
+            )
+        except sqlite3.Error as err:
+            LOGGER.debug("Unable to write fragment cache: {}".format(err))
+
+    def close(self):
+        if self._db is not None and self._pid == os.getpid():
+            self._db.close()
+
+        self._db = None
+        self._pid = None
+
+
+_CACHE = None
+
+
+def enable(path=None):
+    """
+    Use a persistent fragment ion cache for the rest of this process and any
+    workers it forks.
+
+    Parameters
+    ----------
+    path : str, optional
+        Defaults to :data:`DEFAULT_PATH`.
+
+    Returns
+    -------
+    :class:`FragmentCache<pycamv.fragment.frag_cache.FragmentCache>`
+    """
+    global _CACHE
+
+    disable()
+    _CACHE = FragmentCache(path)
+
+    return _CACHE
+
+
+def disable():
+    """
+    Stop using the persistent fragment ion cache.
+    """
+    global _CACHE
+
+    if _CACHE is not None:
+        _CACHE.close()
+
+    _CACHE = None
+
+
+def get_cache():
+    """
+    Get the enabled fragment ion cache.
+
+    Returns
+    -------
+    :class:`FragmentCache<pycamv.fragment.frag_cache.FragmentCache>` or None
+    """
+    return _CACHE
@@ -3,11 +3,11 @@ This module provides functionality for calculating the masses of peptide
 fragments.
 """
 
-from __future__ import absolute_import, division
-
 from collections import Counter
+from functools import lru_cache
+import itertools
 
-from . import masses, ms_labels
+from . import frag_cache, masses, ms_labels
 
 from .losses import PEPTIDE_LOSSES, INTERNAL_LOSSES, AA_LOSSES, MOD_LOSSES
 
@@ -97,24 +97,27 @@ def _internal_fragment_ions(
                 yield name + loss_name, mass + loss_mass
 
 
+@lru_cache(maxsize=None)
+def _residue_mass(letter, mods):
+    return _sequence_mass([(letter, mods)])
+
+
 def _get_frag_masses(pep_seq):
     return [
-        _sequence_mass([pep_seq[index]])
-        for index in range(len(pep_seq))
+        _residue_mass(letter, tuple(mods))
+        for letter, mods in pep_seq
     ]
 
 
+@lru_cache(maxsize=None)
+def _charge_suffix(charge):
+    return "^{{{:+}}}".format(charge) if charge > 1 else "^{+}"
+
+
 def _charged_m_zs(name, mass, max_charge):
     for charge in range(1, max_charge + 1):
         yield (
-            (
-                name +
-                (
-                    "^{{{:+}}}".format(charge)
-                    if charge > 1 else
-                    "^{+}"
-                )
-            ),
+            name + _charge_suffix(charge),
             (mass + charge * masses.PROTON) / charge,
         )
 
@@ -137,11 +140,60 @@ def _generate_c13(c13_num):
         yield c13_name, c13_mass
 
 
+_DEFAULT_LOSSES = {
+    id(losses): losses
+    for losses in [PEPTIDE_LOSSES, INTERNAL_LOSSES, AA_LOSSES, MOD_LOSSES]
+}
+
+
 def _generate_losses(
     pep_seq=None,
     max_depth=2,
     c13_num=0,
     any_losses=None, aa_losses=None, mod_losses=None,
+):
+    # Fragments of different sequences share the same residues, so memoize
+    # the losses of each one when using the built-in loss tables
+    loss_ids = (id(any_losses), id(aa_losses), id(mod_losses))
+
+    if pep_seq is not None and all(i in _DEFAULT_LOSSES for i in loss_ids):
+        return _cached_losses(
+            tuple((letter, tuple(mods)) for letter, mods in pep_seq),
+            max_depth,
+            c13_num,
+            *loss_ids
+        )
+
+    return _iter_losses(
+        pep_seq=pep_seq,
+        max_depth=max_depth,
+        c13_num=c13_num,
+        any_losses=any_losses,
+        aa_losses=aa_losses,
+        mod_losses=mod_losses,
+    )
+
+
+# Each entry holds up to ~100 kB of losses, keep a worker's share bounded
+@lru_cache(maxsize=1 << 9)
+def _cached_losses(pep_seq, max_depth, c13_num, any_id, aa_id, mod_id):
+    return tuple(
+        _iter_losses(
+            pep_seq=pep_seq,
+            max_depth=max_depth,
+            c13_num=c13_num,
+            any_losses=_DEFAULT_LOSSES[any_id],
+            aa_losses=_DEFAULT_LOSSES[aa_id],
+            mod_losses=_DEFAULT_LOSSES[mod_id],
+        )
+    )
+
+
+def _iter_losses(
+    pep_seq=None,
+    max_depth=2,
+    c13_num=0,
+    any_losses=None, aa_losses=None, mod_losses=None,
 ):
     def _generate_loss_combos(
         seq=None,
@@ -262,21 +314,26 @@ def _b_y_ions(
 
     base_ions = {}
 
+    # Running sums of the residue masses from either terminus, prefix_masses[i]
+    # == sum(frag_masses[:i]) and suffix_masses[i] == sum(frag_masses[i:])
+    prefix_masses = [0] + list(itertools.accumulate(frag_masses))
+    suffix_masses = list(itertools.accumulate(reversed(frag_masses)))[::-1]
+
     for index in range(2, len(pep_seq) - 1):
         # XXX: iTRAQ / TMT y-adducts?
         base_ions["a_{{{}}}".format(index - 1)] = (
-            sum(frag_masses[:index]) - masses.MASSES["CO"],
+            prefix_masses[index] - masses.MASSES["CO"],
             pep_seq[:index],
         )
         base_ions["b_{{{}}}".format(index - 1)] = (
-            sum(frag_masses[:index]),
+            prefix_masses[index],
             pep_seq[:index],
         )
 
     for index in range(1, len(pep_seq) - 1):
         # y ion: 1 hydrogen added to NH group, one hydrogen on K/R
         base_ions["y_{{{}}}".format(len(pep_seq) - index - 1)] = (
-            sum(frag_masses[index:]) + masses.PROTON,
+            suffix_masses[index] + masses.PROTON,
             pep_seq[index:],
         )
 
@@ -379,6 +436,71 @@ def fragment_ions(
     assert "N-term" == pep_seq[0][0]
     assert "C-term" == pep_seq[-1][0]
 
+    # Candidate sequences are fragmented repeatedly across scans, memoize
+    # calls that use the default loss tables
+    if any_losses is None and aa_losses is None and mod_losses is None:
+        return dict(
+            _cached_fragment_ions(
+                tuple((letter, tuple(mods)) for letter, mods in pep_seq),
+                charge,
+                parent_max_charge,
+                fragment_max_charge,
+                c13_num,
+            )
+        )
+
+    return _fragment_ions(
+        pep_seq,
+        charge,
+        parent_max_charge=parent_max_charge,
+        fragment_max_charge=fragment_max_charge,
+        c13_num=c13_num,
+        any_losses=any_losses,
+        aa_losses=aa_losses,
+        mod_losses=mod_losses,
+    )
+
+
+# Each entry holds a large ion dict (~0.5 MB); queries are sorted so that
+# neighbouring tasks share sequences, only a few dozen need to be kept
+@lru_cache(maxsize=32)
+def _cached_fragment_ions(
+    pep_seq, charge, parent_max_charge, fragment_max_charge, c13_num,
+):
+    # Fall back to the on-disk cache, when enabled, before recalculating
+    cache = frag_cache.get_cache()
+    key = (pep_seq, charge, parent_max_charge, fragment_max_charge, c13_num)
+
+    if cache is not None:
+        frag_ions = cache.get(key)
+
+        if frag_ions is not None:
+            return frag_ions
+
+    frag_ions = _fragment_ions(
+        pep_seq,
+        charge,
+        parent_max_charge=parent_max_charge,
+        fragment_max_charge=fragment_max_charge,
+        c13_num=c13_num,
+    )
+
+    if cache is not None:
+        cache.put(key, frag_ions)
+
+    return frag_ions
+
+
+def _fragment_ions(
+    pep_seq,
+    charge,
+    parent_max_charge=None,
+    fragment_max_charge=None,
+    c13_num=0,
+    any_losses=None,
+    aa_losses=None,
+    mod_losses=None,
+):
     if parent_max_charge is None:
         parent_max_charge = charge
 
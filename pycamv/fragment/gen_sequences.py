@@ -3,15 +3,13 @@ This module provides functionality for generating all possible combinations of
 modifications on a peptide.
 """
 
-from __future__ import absolute_import, division
-
 import itertools
 
 
 MAX_NUM_COMB = 10
 
 
-def gen_possible_seq(pep_seq, var_mods):
+def gen_possible_seq(pep_seq, var_mods, limit=None):
     """
     Generates sequences
 
@@ -22,10 +20,12 @@ def gen_possible_seq(pep_seq, var_mods):
     ----------
     pep_seq : str
     var_mods : list of tuple of (int, str, list of str)
+    limit : int, optional
+        Stop after this many sequences have been generated.
 
     Returns
     -------
-    generator of list of tuple of (str, list of str)
+    generator of tuple of tuple of (str, tuple of str)
     """
     def _gen_mods(seq, mods):
         if not mods:
@@ -50,13 +50,13 @@ def gen_possible_seq(pep_seq, var_mods):
             )
 
         for mod_indices in itertools.combinations(indices, count):
-            tmp_seq = [
+            tmp_seq = tuple(
                 (
                     letter,
                     (mods + (mod,)) if index in mod_indices else mods,
                 )
                 for index, (letter, mods) in enumerate(seq)
-            ]
+            )
 
             for new_seq in _gen_mods(tmp_seq, mods[1:]):
                 yield new_seq
@@ -67,10 +67,10 @@ def gen_possible_seq(pep_seq, var_mods):
     # (i.e. pY before pSTY)
     var_mods = sorted(var_mods, key=lambda x: len(x[2]))
 
-    # Ideally we would use py>3.3 syntax: yield from, but we are also
-    # supporting py2.7
-    for seq in _gen_mods(
-        seq=list(zip(tmp_seq, [() for _ in tmp_seq])),
-        mods=var_mods,
-    ):
-        yield seq
+    yield from itertools.islice(
+        _gen_mods(
+            seq=tuple((letter, ()) for letter in tmp_seq),
+            mods=var_mods,
+        ),
+        limit,
+    )
@@ -5,76 +5,80 @@ Currently limited to importing and outputing scan lists.
 """
 
 # Built-ins
-from __future__ import absolute_import, division
-
-from collections import OrderedDict
-from functools import partial
+from functools import lru_cache
 import logging
 import multiprocessing
 import os
+from queue import Queue
+import sys
+import threading
+
+import numpy as np
+
+try:
+    from numba import njit
+except ImportError:
+    njit = None
 
-from . import compare, fragments, gen_sequences, ms_labels
+from . import compare, frag_cache, fragments, gen_sequences, ms_labels
 from pycamv.search import search
 from pycamv.export import export
 from pycamv import camv_mat
 from pycamv.scan import scans
 from pycamv.scan import scan_list as sl
-from pycamv.utils import LenGen
 
 
 LOGGER = logging.getLogger("pycamv.validate")
 
+_PHOSPHO_ST = frozenset(["S", "T"])
 
-def _remap_pst(pep_mods):
-    return [
-        (
-            count,
-            mod,
-            letters + (
-                ("Y",)
-                if (mod == "Phospho" and set(letters) == set(["S", "T"])) else
-                ()
-            ),
-        )
-        for count, mod, letters in pep_mods
-    ]
+QUEUE_BATCH_SIZE = 64
 
 
-def _multi_map_seq(*args, **kwargs):
-    lowpriority()
-    return _map_seq(*args, **kwargs)
+@lru_cache(maxsize=None)
+def _remap_pst_mod(count, mod, letters):
+    # Many peptides share the same mods, remap each distinct one only once
+    return (
+        count,
+        mod,
+        letters + (
+            ("Y",)
+            if (mod == "Phospho" and frozenset(letters) == _PHOSPHO_ST) else
+            ()
+        ),
+    )
 
 
-def _map_seq(kv, limit_comb=False):
-    pep_query = kv
+def _remap_pst(pep_mods, remap=_remap_pst_mod):
+    return [remap(count, mod, letters) for count, mod, letters in pep_mods]
 
-    gen = gen_sequences.gen_possible_seq(
-        pep_query.pep_seq,
-        pep_query.pep_mods,
-    )
 
-    if limit_comb:
-        return (
-            pep_query,
-            tuple(
-                seq
-                for index, seq in zip(
-                    range(gen_sequences.MAX_NUM_COMB),
-                    gen,
-                )
-            )
-        )
-    else:
-        return (
-            pep_query,
-            tuple(gen),
+def _remap_query(pep_query, remap=_remap_pst):
+    pep_query.pep_var_mods = remap(pep_query.pep_var_mods)
+    pep_query.pep_fixed_mods = remap(pep_query.pep_fixed_mods)
+
+
+def _seq_key(pep_query):
+    return (pep_query.pep_seq, tuple(pep_query.pep_mods))
+
+
+@lru_cache(maxsize=64)
+def _get_sequences(pep_seq, pep_mods, limit_comb=False):
+    # Cached per process, queries sharing a peptide and modification set
+    # share their sequences
+    return tuple(
+        gen_sequences.gen_possible_seq(
+            pep_seq,
+            pep_mods,
+            limit=gen_sequences.MAX_NUM_COMB if limit_comb else None,
         )
+    )
 
 
 def _to_str(seq):
     return "".join(
         letter.lower()
-        if [i for i in mods if i not in ms_labels.LABEL_NAMES]
+        if any(i not in ms_labels.LABEL_NAMES for i in mods)
         else letter.upper()
         for letter, mods in seq[1:-1]
     )
@@ -93,46 +97,104 @@ def _close_scans(ms_datas):
                 del raw._tmp_dir
 
 
+def _max_c13_kernel(mzs, isolation_mz, delta_c13, z, max_c13, ms_tol):
+    # Precursor windows are small, so a compiled loop that stops at the
+    # highest matching C13 peak beats allocating numpy temporaries
+    for c13 in range(max_c13 - 1, 0, -1):
+        c13_mz = isolation_mz + delta_c13 * c13 / z
+
+        for mz in mzs:
+            if 1e6 * abs(c13_mz - mz) / mz < ms_tol:
+                return c13
+
+    return 0
+
+
+if njit is not None:
+    _max_c13_kernel = njit(cache=True)(_max_c13_kernel)
+
+
 def _get_window_coverage(pep_query, scan_query, precursor_win):
-    precursor_win = [
-        mz
-        for mz, _ in precursor_win
-        if mz >= scan_query.isolation_mz - scan_query.window_offset[0] and
-        mz <= scan_query.isolation_mz + scan_query.window_offset[1]
-    ]
+    if not scan_query.window_offset:
+        return 0
+
+    # Peaks come from a centroided spectrum, already sorted by m/z
+    mzs = np.fromiter((mz for mz, _ in precursor_win), dtype=np.float64)
+    low = np.searchsorted(
+        mzs, scan_query.isolation_mz - scan_query.window_offset[0],
+        side="left",
+    )
+    high = np.searchsorted(
+        mzs, scan_query.isolation_mz + scan_query.window_offset[1],
+        side="right",
+    )
+    mzs = mzs[low:high]
     max_c13 = int(1 + round(scan_query.window_offset[1] * pep_query.pep_exp_z))
 
-    return (
-        max([
-            c13
-            for c13 in range(1, max_c13)
-            if min([
-                1e6 * abs(
-                    scan_query.isolation_mz +
-                    fragments.DELTA_C13 * c13 / pep_query.pep_exp_z -
-                    mz
-                ) / mz
-                for mz in precursor_win
-            ] + [compare.MS_TOL]) < compare.MS_TOL
-        ] + [0])
-        if scan_query.window_offset
-        else 0
+    if max_c13 <= 1 or not mzs.size:
+        return 0
+
+    if njit is not None:
+        return _max_c13_kernel(
+            mzs, scan_query.isolation_mz, fragments.DELTA_C13,
+            pep_query.pep_exp_z, max_c13, compare.MS_TOL,
+        )
+
+    c13s = np.arange(1, max_c13)
+    c13_mzs = (
+        scan_query.isolation_mz +
+        fragments.DELTA_C13 * c13s / pep_query.pep_exp_z
+    )
+
+    # ppm error of every precursor peak against each C13 peak
+    ppm = 1e6 * np.abs(c13_mzs[:, None] - mzs[None, :]) / mzs[None, :]
+    found = c13s[(ppm < compare.MS_TOL).any(axis=1)]
+
+    return int(found[-1]) if found.size else 0
+
+
+# Scan and validation data shared by every fragment compare task. Pool
+# workers receive it once through _init_worker instead of with each task.
+_WORKER_DATA = {}
+
+
+def _set_worker_data(
+    scan_mapping, ms_two_data, ms_data, validation_data, auto_maybe,
+    limit_comb,
+):
+    _WORKER_DATA.update(
+        scan_mapping=scan_mapping,
+        ms_two_data=ms_two_data,
+        ms_data=ms_data,
+        validation_data=validation_data,
+        auto_maybe=auto_maybe,
+        limit_comb=limit_comb,
     )
 
 
-def _multi_map_frag_compare(*args, **kwargs):
+def _init_worker(
+    scan_mapping, ms_two_data, ms_data, validation_data, auto_maybe,
+    limit_comb, frag_cache_path=None,
+):
     lowpriority()
-    return _map_frag_compare(*args, **kwargs)
+    _set_worker_data(
+        scan_mapping, ms_two_data, ms_data, validation_data, auto_maybe,
+        limit_comb,
+    )
 
+    # Spawned workers do not inherit the parent's cache, open it again
+    if frag_cache_path is not None:
+        frag_cache.enable(frag_cache_path)
 
-def _map_frag_compare(kv):
-    try:
-        (
-            pep_query, scan_query, sequence,
-            ms_two_data, ms_data,
-            validation_data, auto_maybe,
-        ) = kv
 
+def _map_frag_compare(pep_query):
+    scan_query = _WORKER_DATA["scan_mapping"][pep_query]
+    ms_two_data = _WORKER_DATA["ms_two_data"]
+    ms_data = _WORKER_DATA["ms_data"]
+    validation_data = _WORKER_DATA["validation_data"]
+    auto_maybe = _WORKER_DATA["auto_maybe"]
+
+    try:
         ms_scan = ms_data[scan_query.basename][scan_query.precursor_scan]
 
         if ms_scan["id"] != scan_query.precursor_scan:
@@ -156,12 +218,6 @@ def _map_frag_compare(kv):
             pep_query, scan_query, precursor_win,
         )
 
-        frag_ions = fragments.fragment_ions(
-            sequence,
-            pep_query.pep_exp_z,
-            c13_num=scan_query.c13_num + window_coverage,
-        )
-
         # Compare MS^2 data with predicted fragment ions
         try:
             ms_two_scan = ms_two_data[pep_query.basename][pep_query.scan]
@@ -172,7 +228,7 @@ def _map_frag_compare(kv):
                     err,
                 )
             )
-            return
+            return []
 
         if ms_two_scan["id"] != scan_query.scan:
             LOGGER.warning(
@@ -185,11 +241,6 @@ def _map_frag_compare(kv):
                 )
             )
 
-        peaks = compare.compare_spectra(
-            ms_two_scan, frag_ions,
-            tol=compare.COLLISION_TOLS[scan_query.collision_type],
-        )
-
         quant_scan = (
             ms_two_data[pep_query.basename][pep_query.quant_scan]
             if pep_query.scan != pep_query.quant_scan else
@@ -198,96 +249,131 @@ def _map_frag_compare(kv):
 
         label_win = scans.get_label_peak_window(pep_query, quant_scan)
 
-        choice = validation_data.get((pep_query.scan, _to_str(sequence)), None)
+        # Everything above depends only on the scan, share it between all
+        # of this query's candidate sequences
+        sequences = _get_sequences(
+            *_seq_key(pep_query),
+            limit_comb=_WORKER_DATA["limit_comb"]
+        )
+        tol = compare.COLLISION_TOLS[scan_query.collision_type]
+        c13_num = scan_query.c13_num + window_coverage
+        results = []
+
+        for sequence in sequences:
+            frag_ions = fragments.fragment_ions(
+                sequence,
+                pep_query.pep_exp_z,
+                c13_num=c13_num,
+            )
 
-        if not choice and auto_maybe:
-            if (
-                pep_query.rank_pos is not None and
-                pep_query.rank_pos.get(1, None) == set(
-                    (pos, mod)
-                    for pos, (_, mods) in enumerate(sequence[1:-1])
-                    for mod in mods
-                )
-            ):
-                choice = "maybe"
+            peaks = compare.compare_spectra(ms_two_scan, frag_ions, tol=tol)
 
-        return (
-            pep_query, tuple(sequence), choice,
-            peaks, precursor_win, label_win,
-        )
+            # Only build the sequence key when there is validation data
+            choice = validation_data.get(
+                (pep_query.scan, _to_str(sequence)), None,
+            ) if validation_data else None
+
+            if not choice and auto_maybe:
+                if (
+                    pep_query.rank_pos is not None and
+                    pep_query.rank_pos.get(1, None) == set(
+                        (pos, mod)
+                        for pos, (_, mods) in enumerate(sequence[1:-1])
+                        for mod in mods
+                    )
+                ):
+                    choice = "maybe"
+
+            results.append((
+                pep_query, sequence, choice,
+                peaks, precursor_win, label_win,
+            ))
+
+        return results
     except Exception:
         _close_scans([ms_data, ms_two_data])
         raise
 
 
 def fill_map_frag_compare(
-    sequence_mapping,
+    pep_queries,
     scan_mapping,
     ms_two_data,
     ms_data,
     queue,
-    cpu_count,
     validation_data,
     auto_maybe,
+    limit_comb=False,
+    pool=None,
+    chunksize=1,
 ):
-    total_num_seq = sum(len(i) for i in sequence_mapping.values())
-    pool = None
+    """
+    Generate each peptide's possible sequences, compare them against its
+    scan, and put the results on queue in batches, followed by
+    :data:`pycamv.export.export.SENTINEL`.
 
-    try:
-        if cpu_count > 1:
-            pool = multiprocessing.Pool(
-                processes=cpu_count - 1,
-            )
+    Parameters
+    ----------
+    pep_queries : list of :class:`PeptideQuery<pycamv.pep_query.PeptideQuery>`
+    scan_mapping : dict of PeptideQuery, ScanQuery
+    ms_two_data : dict
+    ms_data : dict
+    queue : :class:`queue.Queue`
+    validation_data : dict
+    auto_maybe : bool
+    limit_comb : bool, optional
+    pool : :class:`multiprocessing.pool.Pool`, optional
+        Must be created with :func:`_init_worker` and the same scan mapping,
+        scan, and validation data.
+    chunksize : int, optional
+    """
+    _set_worker_data(
+        scan_mapping, ms_two_data, ms_data, validation_data, auto_maybe,
+        limit_comb,
+    )
 
-            peak_hits = pool.imap_unordered(
-                func=_multi_map_frag_compare,
-                iterable=LenGen(
-                    gen=(
-                        (
-                            pep_query,
-                            scan_mapping[pep_query],
-                            sequence,
-                            ms_two_data,
-                            ms_data,
-                            validation_data,
-                            auto_maybe,
-                        )
-                        for pep_query, sequences in sequence_mapping.items()
-                        for sequence in sequences
-                    ),
-                    len=total_num_seq,
-                ),
-            )
-        else:
-            peak_hits = (
-                _map_frag_compare(
-                    (
-                        pep_query,
-                        scan_mapping[pep_query],
-                        sequence,
-                        ms_two_data,
-                        ms_data,
-                        validation_data,
-                        auto_maybe,
-                    )
-                )
-                for pep_query, sequences in sequence_mapping.items()
-                for sequence in sequences
-            )
+    # Order queries so those sharing sequences land in the same chunk and
+    # hit the same worker's sequence cache. Workers look up each query's
+    # scan in their own copy of scan_mapping.
+    frag_compare_args = sorted(pep_queries, key=_seq_key)
 
-        for item in peak_hits:
-            queue.put(item)
+    if pool:
+        peak_hits = pool.imap_unordered(
+            func=_map_frag_compare,
+            chunksize=chunksize,
+            iterable=frag_compare_args,
+        )
+    else:
+        peak_hits = (
+            _map_frag_compare(pep_query)
+            for pep_query in frag_compare_args
+        )
 
-        if pool:
-            pool.close()
-    except Exception:
-        if pool:
-            pool.terminate()
+    # Send results in batches to cut down on queue locking
+    batch = []
 
-        raise
+    try:
+        for items in peak_hits:
+            batch.extend(items)
+
+            if len(batch) >= QUEUE_BATCH_SIZE:
+                queue.put(batch)
+                batch = []
+
+        if batch:
+            queue.put(batch)
     finally:
-        if pool:
-            pool.join()
+        queue.put(export.SENTINEL)
+
+
+def _get_pool_context():
+    # Workers inherit the opened scan data and compiled kernels by forking;
+    # newer Pythons otherwise default to forkserver on Linux. Forking is not
+    # safe on macOS, which keeps its spawn default.
+    if sys.platform.startswith("linux"):
+        return multiprocessing.get_context("fork")
+
+    return multiprocessing.get_context()
 
 
 # Taken from https://stackoverflow.com/questions/1023038/
@@ -332,6 +418,7 @@ def validate_spectra(
     cpu_count=None,
     reprocess=False,
     auto_maybe=False,
+    frag_cache_path=None,
 ):
     """
     Generate CAMV web page for validating spectra.
@@ -341,13 +428,16 @@ def validate_spectra(
     search_path : str
     raw_paths : list of str
     scans_path : str, optional
-    scan_list : list of int, optional
+    scan_list : iterable of int, optional
     score : int, optional
     mat_sessions : list of str, optional
     out_path : str, optional
     cpu_count : int, optional
     reprocess : bool, optional
     auto_maybe : bool, optional
+    frag_cache_path : str, optional
+        Reuse fragment ions stored in this file by previous runs (See
+        :data:`pycamv.fragment.frag_cache.DEFAULT_PATH`).
     """
     if cpu_count is None:
         try:
@@ -366,6 +456,9 @@ def validate_spectra(
     if scans_path is not None:
         scan_list += sl.load_scan_list(scans_path)
 
+    # Constant time membership tests when filtering queries by scan
+    scan_list = frozenset(scan_list)
+
     if out_path is None:
         out_path = os.path.splitext(search_path)[0] + ".camv.gz"
 
@@ -389,28 +482,40 @@ def validate_spectra(
     # Remap pST -> pSTY
     LOGGER.info("Remapping pST -> pSTY")
     for pep_query in pep_queries:
-        pep_query.pep_var_mods = _remap_pst(pep_query.pep_var_mods)
-        pep_query.pep_fixed_mods = _remap_pst(pep_query.pep_fixed_mods)
+        _remap_query(pep_query)
 
     # Get scan data from RAW file
     required_raws = set(query.basename for query in pep_queries)
-    base_raw_paths = [os.path.basename(path) for path in raw_paths]
+    base_raw_paths = set(os.path.basename(path) for path in raw_paths)
+    search_dir = os.path.dirname(search_path)
+    search_dirs = [
+        search_dir,
+        os.path.join(search_dir, ".."),
+        os.path.join(search_dir, "..", "MS RAW"),
+        os.path.join(search_dir, "..", "Tau MS RAW"),
+        os.path.join(search_dir, "..", "CK MS RAW"),
+        os.path.join(search_dir, "..", "5XFAD MS RAW"),
+    ]
     missing = []
+    local_raw_paths = {}
 
-    for base_raw in required_raws:
-        if base_raw in base_raw_paths:
+    # List each directory once rather than probing it for every RAW file
+    for base_dir in search_dirs:
+        try:
+            entries = os.listdir(base_dir)
+        except EnvironmentError:
             continue
 
-        search_dir = os.path.dirname(search_path)
+        for entry in entries:
+            local_raw_paths.setdefault(entry, os.path.join(base_dir, entry))
 
-        for base_dir in [
-            search_dir,
-            os.path.join(search_dir, ".."),
-            os.path.join(search_dir, "..", "MS RAW"),
-            os.path.join(search_dir, "..", "Tau MS RAW"),
-            os.path.join(search_dir, "..", "CK MS RAW"),
-            os.path.join(search_dir, "..", "5XFAD MS RAW"),
-        ]:
+    for base_raw in required_raws - base_raw_paths:
+        if base_raw in local_raw_paths:
+            raw_paths.append(local_raw_paths[base_raw])
+            continue
+
+        # Fall back to the filesystem for case-insensitive matches
+        for base_dir in search_dirs:
             local_raw_path = os.path.join(base_dir, base_raw)
 
             if os.path.exists(local_raw_path):
@@ -422,45 +527,8 @@ def validate_spectra(
     if missing:
         raise Exception(
             "Unable to find {} in input RAW files: {}"
-            .format(missing, base_raw_paths)
-        )
-
-    # Generate sequences
-    LOGGER.info(
-        "Generating all possible sequence-modification combinations."
-    )
-
-    if cpu_count > 1:
-        pool = multiprocessing.Pool(
-            processes=cpu_count,
-        )
-        try:
-            sequence_mapping = dict(
-                pool.imap_unordered(
-                    partial(_multi_map_seq, limit_comb=not reprocess),
-                    pep_queries,
-                )
-            )
-            pool.close()
-        except Exception:
-            pool.terminate()
-            raise
-        finally:
-            pool.join()
-    else:
-        sequence_mapping = dict(
-            _map_seq(pep_query, limit_comb=not reprocess)
-            for pep_query in pep_queries
-        )
-
-    total_num_seq = sum(len(i) for i in sequence_mapping.values())
-
-    LOGGER.info(
-        "Generating fragment ions for {} possible sequences."
-        .format(
-            total_num_seq,
+            .format(missing, sorted(base_raw_paths))
         )
-    )
 
     # Import validation data from CAMV-Matlab
     validation_data = {}
@@ -483,55 +551,74 @@ def validate_spectra(
         pep_queries,
     )
 
-    process = None
+    # Workers generate sequences and compare fragments for each query. One
+    # core is left for exporting results.
+    pool = None
+    thread = None
+
+    if frag_cache_path is not None:
+        # Workers open their own connection in _init_worker
+        LOGGER.info("Using fragment cache: {}".format(frag_cache_path))
+        frag_cache.enable(frag_cache_path)
 
     try:
         LOGGER.info("Found data for {} scans".format(len(scan_queries)))
 
-        scan_mapping = OrderedDict(
-            (pep_query, scan_query)
-            for pep_query, scan_query in zip(pep_queries, scan_queries)
-        )
+        scan_mapping = dict(zip(pep_queries, scan_queries))
 
-        # Generate fragments and assign peaks to fragments
-        LOGGER.info(
-            (
-                "Comparing predicted to actual peaks for {} spectra "
-                " ({} pep-scan combinations)."
-            ).format(
-                len(scan_mapping),
-                total_num_seq,
-            )
-        )
+        if cpu_count > 1:
+            # Compile JIT kernels before forking, so workers inherit them
+            compare.warm_up()
 
-        queue = multiprocessing.Queue()
+            if njit is not None:
+                _max_c13_kernel(np.ones(1), 1.0, 1.0, 1, 2, compare.MS_TOL)
 
-        if cpu_count > 1:
-            process = multiprocessing.Process(
-                target=fill_map_frag_compare,
-                args=(
-                    sequence_mapping,
-                    scan_mapping,
-                    ms_two_data,
-                    ms_data,
-                    queue,
-                    cpu_count,
-                    validation_data,
-                    auto_maybe,
+            pool = _get_pool_context().Pool(
+                processes=cpu_count - 1,
+                initializer=_init_worker,
+                initargs=(
+                    scan_mapping, ms_two_data, ms_data, validation_data,
+                    auto_maybe, not reprocess, frag_cache_path,
                 ),
             )
-            process.start()
+
+        # Generate sequences, fragments, and assign peaks to fragments
+        LOGGER.info(
+            "Comparing predicted to actual peaks for {} spectra."
+            .format(len(scan_mapping))
+        )
+
+        queue = Queue()
+        fill_args = (
+            pep_queries,
+            scan_mapping,
+            ms_two_data,
+            ms_data,
+            queue,
+            validation_data,
+            auto_maybe,
+        )
+
+        fill_errors = []
+
+        def _fill_from_pool():
+            try:
+                fill_map_frag_compare(
+                    *fill_args,
+                    limit_comb=not reprocess,
+                    pool=pool,
+                    chunksize=max(1, len(pep_queries) // (cpu_count * 8))
+                )
+            except Exception as err:
+                fill_errors.append(err)
+
+        if pool:
+            # Feed the pool's results from a thread while this thread exports
+            thread = threading.Thread(target=_fill_from_pool)
+            thread.daemon = True
+            thread.start()
         else:
-            fill_map_frag_compare(
-                sequence_mapping,
-                scan_mapping,
-                ms_two_data,
-                ms_data,
-                queue,
-                cpu_count,
-                validation_data,
-                auto_maybe,
-            )
+            fill_map_frag_compare(*fill_args, limit_comb=not reprocess)
 
         # XXX: Determine SILAC precursor masses?
 
@@ -540,26 +627,37 @@ def validate_spectra(
         # Check each assignment to each scan
 
         # Output data
-        export.export_to_sql(
+        total_num_seq = export.export_to_sql(
             os.path.splitext(out_path)[0] + ".db",
             queue,
             scan_mapping,
             search_path,
             raw_paths,
-            total_num_seq=total_num_seq,
             reprocess=reprocess,
         )
+
+        if thread:
+            thread.join()
+
+        if fill_errors:
+            raise fill_errors[0]
+
+        if pool:
+            pool.close()
     except Exception:
-        if process:
-            process.terminate()
+        if pool:
+            pool.terminate()
 
         raise
     finally:
-        if process:
-            process.join()
+        if pool:
+            pool.join()
 
         LOGGER.info('finishing')
         _close_scans([ms_data, ms_two_data])
+
+        if frag_cache_path is not None:
+            frag_cache.disable()
         del ms_data
         del ms_two_data
 
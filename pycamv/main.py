@@ -97,6 +97,20 @@ def _parse_args(args):
         nargs="+",
         help="Path to CAMV-Matlab session files.",
     )
+    parser.add_argument(
+        "--fragment-cache",
+        action="store_const",
+        const=fragment.frag_cache.DEFAULT_PATH,
+        help="Reuse fragment ions calculated by previous runs, stored in {}."
+        .format(fragment.frag_cache.DEFAULT_PATH),
+    )
+    parser.add_argument(
+        "--fragment-cache-path",
+        dest="fragment_cache",
+        metavar="PATH",
+        help="Reuse fragment ions calculated by previous runs, stored in this "
+        "file.",
+    )
     parser.add_argument(
         "--out-path",
         help="Output path for CAMV export.",
@@ -207,6 +221,7 @@ def main(args):
         reprocess=args.reprocess,
         auto_maybe=args.auto_maybe,
         cpu_count=args.cpus,
+        frag_cache_path=args.fragment_cache,
     )
 
 
@@ -2,8 +2,6 @@
 Provides functions for interacting with MS data through ProteoWizard.
 """
 
-from __future__ import absolute_import, division
-
 import hashlib
 import logging
 import os
@@ -15,11 +13,6 @@ import tarfile
 import tempfile
 import requests
 
-try:
-    tempfile.TemporaryDirectory
-except AttributeError:
-    from backports import tempfile
-
 import pymzml
 
 
@@ -31,6 +31,12 @@ RE_B_Y_IONS = re.compile(r"([abcxyz]_\{[0-9]+\})(.*)\^\{\+\}")
 """
 Regex matching b/y ion names.
 """
+RE_ION_SCRIPT = re.compile(
+    r"\^\{([^}]*)\}|_\{([^}]*)\}|\^([^{}^_])|_([^{}^_])|[\^_{}]"
+)
+"""
+Regex matching super- / subscript blocks in ion names.
+"""
 RE_SCAN_NUM = re.compile(r"(scans:|Cmpd_)(\d+)")
 """
 Regex matching Scan Number in .mzML.
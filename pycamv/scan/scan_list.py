@@ -1,6 +1,3 @@
-
-from __future__ import absolute_import, division
-
 import logging
 import os
 
@@ -10,9 +7,18 @@ LOGGER = logging.getLogger("pycamv.scan_list")
 def load_scan_xlsx(path):
     from openpyxl import load_workbook
 
-    wb = load_workbook(path)
-    ws = wb.active
-    rows = [row[0].value for row in ws.iter_rows()]
+    # Stream the sheet, scan numbers are only ever in the first column
+    wb = load_workbook(path, read_only=True, data_only=True)
+
+    try:
+        rows = [
+            row[0].value
+            for row in wb.active.iter_rows(max_col=1)
+            if row
+        ]
+    finally:
+        wb.close()
+
     rows = [i for i in rows if isinstance(i, int)]
 
     return rows
@@ -2,8 +2,7 @@
 This module provides functionality for interacting with mass spec scan data.
 """
 
-from __future__ import absolute_import, division
-
+from itertools import dropwhile, takewhile
 import logging
 import os
 import xml.etree.ElementTree as ET
@@ -27,6 +26,16 @@ class ScanQuery:
     c13_num : int
     basename : str or None
     """
+    __slots__ = (
+        "scan",
+        "precursor_scan",
+        "window_offset",
+        "isolation_mz",
+        "collision_type",
+        "c13_num",
+        "basename",
+    )
+
     def __init__(
         self,
         scan,
@@ -130,6 +139,31 @@ def _c13_num(pep_query, isolation_mz):
     )
 
 
+def _peaks_in_window(peaks, low, high):
+    """
+    Get the peaks strictly between two m/z values.
+
+    Parameters
+    ----------
+    peaks : list of tuple of (float, float)
+        Centroided peaks, sorted by m/z.
+    low : float
+    high : float
+
+    Returns
+    -------
+    list of tuple of (float, float)
+    """
+    # Peaks are sorted, skip up to the window and stop once past it
+    return [
+        (mz, i)
+        for mz, i in takewhile(
+            lambda peak: peak[0] < high,
+            dropwhile(lambda peak: peak[0] <= low, peaks),
+        )
+    ]
+
+
 def get_precursor_peak_window(
     scan_query,
     scan=None, ms_data=None, window_size=1
@@ -162,11 +196,7 @@ def get_precursor_peak_window(
     if scan is None:
         scan = ms_data[scan_query.basename][scan_query.precursor_scan]
 
-    return [
-        (mz, i)
-        for mz, i in scan.centroidedPeaks
-        if mz > window[0] and mz < window[1]
-    ]
+    return _peaks_in_window(scan.centroidedPeaks, *window)
 
 
 def get_label_peak_window(
@@ -204,11 +234,7 @@ def get_label_peak_window(
     if scan is None:
         scan = ms_data[pep_query.basename][pep_query.quant_scan]
 
-    return [
-        (mz, i)
-        for mz, i in scan.centroidedPeaks
-        if mz > window[0] and mz < window[1]
-    ]
+    return _peaks_in_window(scan.centroidedPeaks, *window)
 
 
 def get_scan_data(raw_paths, pep_queries):
@@ -2,10 +2,9 @@
 Provides functionality for interacting with ProteomeDiscoverer data.
 """
 
-from __future__ import absolute_import, division
-
 from collections import Counter, defaultdict
 from datetime import datetime
+from functools import lru_cache
 import logging
 import os
 import sqlite3
@@ -41,7 +40,10 @@ def _parse_letters(letters):
     return tuple(letters)
 
 
+@lru_cache(maxsize=None)
 def _find_mod(abbrev, letter, pot_mods):
+    # pot_mods is a tuple of (name, letters), so each distinct residue /
+    # modification pair is only searched for once per run.
     for pot_mod in pot_mods:
         if letter not in pot_mod[1]:
             continue
@@ -573,14 +575,18 @@ def _get_peptide_queries(
     # index = 0
     # scan_used = {}
 
-    fixed_mods = [
-        regexes.RE_DYN_MODS.match(i).group(3, 4)
+    if scan_list:
+        scan_list = frozenset(scan_list)
+
+    match_mod = regexes.RE_DYN_MODS.match
+    fixed_mods = tuple(
+        match_mod(i).group(3, 4)
         for i in fixed_mods
-    ]
-    var_mods = [
-        regexes.RE_DYN_MODS.match(i).group(3, 4)
+    )
+    var_mods = tuple(
+        match_mod(i).group(3, 4)
         for i in var_mods
-    ]
+    )
 
     query = _get_pep_info(conn, pd_version)
 
@@ -690,18 +696,17 @@ def _reassign_rank(mods, rank_pos, psp_val):
 
     # phophoRS example format: "T(4): 99.6; S(6): 0.4; S(10): 0.0"
     # Error messages include: "Too many isoforms"
+    match_psp = RE_PSP.match
     psp_val = [
-        RE_PSP.match(i.strip())
-        for i in psp_val.split(";")
-    ]
-    psp_val = [
-        i.groups()
-        for i in psp_val
-        if i
-    ]
-    psp_val = [
-        (i[0], int(i[1]), float(i[2]))
-        for i in psp_val
+        (letter, int(pos), float(val))
+        for letter, pos, val in (
+            match.groups()
+            for match in (
+                match_psp(i.strip())
+                for i in psp_val.split(";")
+            )
+            if match
+        )
     ]
 
     if 1 not in rank_pos:
@@ -803,7 +808,7 @@ def read_discoverer_msf(msf_path, scan_list=None, score=None):
     ----------
     msf_path : str
         Path to MSF file.
-    scan_list : list of int, optional
+    scan_list : iterable of int, optional
     score : int, optional
 
     Returns
@@ -1,17 +1,9 @@
-
-from __future__ import absolute_import, division
-
 import ntpath
 import os
 
 from pycamv.utils import nCr, fuzzy_find
 from pycamv.fragment import ms_labels
 
-try:
-    basestring
-except NameError:
-    basestring = str
-
 
 class PeptideQuery:
     """
@@ -35,6 +27,28 @@ class PeptideQuery:
     num_comb : int
     rank_pos : set of tuple of int, str or None
     """
+    # Thousands of queries are held for a run and pickled to workers, skip
+    # the per-instance __dict__
+    __slots__ = (
+        "accessions",
+        "prot_descs",
+        "uniprot_accessions",
+        "full_seqs",
+        "pep_offsets",
+        "query",
+        "filename",
+        "pep_score",
+        "pep_exp_mz",
+        "pep_exp_z",
+        "pep_seq",
+        "pep_var_mods",
+        "pep_fixed_mods",
+        "scan",
+        "quant_scan",
+        "num_comb",
+        "rank_pos",
+    )
+
     def __init__(
         self,
         query,
@@ -114,13 +128,14 @@ class PeptideQuery:
 
     def _calc_num_comb(self):
         num_comb = 1
+        residues = list(self.pep_seq) + ["N-term", "C-term"]
 
         for count, mod, letters in self.pep_var_mods:
             if mod == "Phospho" and letters == ["S", "T"]:
                 letters = ["S", "T", "Y"]
 
             potential_mod_sites = sum(
-                (list(self.pep_seq) + ["N-term", "C-term"]).count(i)
+                residues.count(i)
                 for i in letters
             )
 
@@ -138,9 +153,9 @@ class PeptideQuery:
 def _check_mods(mods):
     return all(
         isinstance(count, int) and
-        isinstance(abbrev, basestring) and
+        isinstance(abbrev, str) and
         isinstance(letters, tuple) and
-        all(isinstance(i, basestring) for i in letters)
+        all(isinstance(i, str) for i in letters)
         for count, abbrev, letters in mods
     )
 
@@ -2,8 +2,6 @@
 Provides functionality for interacting with MASCOT data.
 """
 
-from __future__ import absolute_import, division
-
 import logging
 import os
 
@@ -24,7 +22,7 @@ def read_search_file(path, scan_list=None, score=None):
     ----------
     path : str
         Path to search input file.
-    scan_list : list of int, optional
+    scan_list : iterable of int, optional
     score : int, optional
 
     Returns
@@ -1,90 +1,32 @@
 """Utility functions used in other modules."""
 
-from __future__ import absolute_import, division
-
-import copy
-from collections import OrderedDict, Callable
+from collections import defaultdict
 import difflib
-import itertools
-import math
-
-from . import regexes
-
-
-def nCr(n, r):
-    f = math.factorial
-    return f(n) / f(r) / f(n - r)
-
-
-class LenGen(object):
-    def __init__(self, gen, len):
-        self.gen = gen
-        self.len = len
-
-    def __call__(self):
-        return itertools.islice(self.gen(), self.len)
-
-    def __iter__(self):
-        return self.gen
-
-    def __len__(self):
-        return self.len
-
-
-class DefaultOrderedDict(OrderedDict):
-    # Source: http://stackoverflow.com/a/6190500/562769
-    def __init__(self, default_factory=None, *a, **kw):
-        if (
-            default_factory is not None and
-            not isinstance(default_factory, Callable)
-        ):
-            raise TypeError("first argument must be callable")
-
-        OrderedDict.__init__(self, *a, **kw)
-        self.default_factory = default_factory
-
-    def __getitem__(self, key):
-        try:
-            return OrderedDict.__getitem__(self, key)
-        except KeyError:
-            return self.__missing__(key)
+from functools import lru_cache
 
-    def __missing__(self, key):
-        if self.default_factory is None:
-            raise KeyError(key)
-
-        self[key] = value = self.default_factory()
-
-        return value
+try:
+    from math import comb as nCr
+except ImportError:
+    _FACTORIALS = [1]
 
-    def __reduce__(self):
-        if self.default_factory is None:
-            args = tuple()
-        else:
-            args = self.default_factory,
+    def nCr(n, r):
+        # Match math.comb, which returns 0 when r > n
+        if r > n:
+            return 0
 
-        return type(self), args, None, None, self.items()
+        while len(_FACTORIALS) <= n:
+            _FACTORIALS.append(_FACTORIALS[-1] * len(_FACTORIALS))
 
-    def copy(self):
-        return self.__copy__()
+        return _FACTORIALS[n] // (_FACTORIALS[r] * _FACTORIALS[n - r])
 
-    def __copy__(self):
-        return type(self)(
-            self.default_factory,
-            self,
-        )
+from . import regexes
 
-    def __deepcopy__(self, memo):
-        return type(self)(
-            self.default_factory,
-            copy.deepcopy(self.items()),
-        )
 
-    def __repr__(self):
-        return "OrderedDefaultDict({}, {})".format(
-            self.default_factory,
-            OrderedDict.__repr__(self),
-        )
+DefaultOrderedDict = defaultdict
+"""
+Alias of :class:`collections.defaultdict`, which keeps insertion order on
+Python 3.7+.
+"""
 
 
 class StrToBin(object):
@@ -96,8 +38,8 @@ class StrToBin(object):
         self.f.write(data.encode(self.encoding))
 
 
-SUPERSCRIPT_UNICODE_START = ord(u"\u2070")
-SUBSCRIPT_UNICODE_START = ord(u'\u2080')
+SUPERSCRIPT_UNICODE_START = ord("\u2070")
+SUBSCRIPT_UNICODE_START = ord('\u2080')
 SCRIPT_MAPPING = {
     str(i): i
     for i in range(10)
@@ -107,56 +49,46 @@ SCRIPT_MAPPING["-"] = 11
 SCRIPT_MAPPING["("] = 12
 SCRIPT_MAPPING[")"] = 13
 
-try:
-    unichr
-except NameError:
-    unichr = chr
+SUPERSCRIPT_TRANS = {
+    ord(char): chr(SUPERSCRIPT_UNICODE_START + offset)
+    for char, offset in SCRIPT_MAPPING.items()
+}
+SUPERSCRIPT_TRANS[ord("1")] = "\u00B9"
+SUPERSCRIPT_TRANS[ord("2")] = "\u00B2"
+SUPERSCRIPT_TRANS[ord("3")] = "\u00B3"
+SUBSCRIPT_TRANS = {
+    ord(char): chr(SUBSCRIPT_UNICODE_START + offset)
+    for char, offset in SCRIPT_MAPPING.items()
+}
 
 
+def _rewrite_script(match):
+    index = match.lastindex
+
+    # Stray ^_{} characters are dropped
+    if index is None:
+        return ""
+
+    return match.group(index).translate(
+        SUPERSCRIPT_TRANS if index in (1, 3) else SUBSCRIPT_TRANS
+    )
+
+
+_RE_B_Y_IONS = regexes.RE_B_Y_IONS
+_RE_ION_SCRIPT = regexes.RE_ION_SCRIPT
+
+
+@lru_cache(maxsize=1 << 16)
 def rewrite_ion_name(name):
-    m = regexes.RE_B_Y_IONS.match(name)
+    m = _RE_B_Y_IONS.match(name)
 
     if m:
         name = "".join(m.group(1, 2))
 
-    ret = ""
-    sup, sub = False, False
-    paren = 0
-
-    for char in name:
-        if char in "^_{}":
-            if char == "^":
-                sup, sub = True, False
-            elif char == "_":
-                sup, sub = False, True
-            elif char == "}":
-                sup, sub = False, False
-                paren -= 1
-            elif char == "{":
-                paren += 1
-            continue
-
-        if sup:
-            if char == "1":
-                ret += u"\u00B9"
-            elif char == "2":
-                ret += u"\u00B2"
-            elif char == "3":
-                ret += u"\u00B3"
-            else:
-                ret += unichr(SUPERSCRIPT_UNICODE_START + SCRIPT_MAPPING[char])
-        elif sub:
-            ret += unichr(SUBSCRIPT_UNICODE_START + SCRIPT_MAPPING[char])
-        else:
-            ret += char
-
-        if sup or sub:
-            if not paren:
-                sup, sub = False, False
-
-    return ret
+    return _RE_ION_SCRIPT.sub(_rewrite_script, name)
 
 
+@lru_cache(maxsize=4096)
 def fuzzy_find(needle, haystack):
     """
     Find the longest matching subsequence of needle within haystack.
@@ -174,4 +106,5 @@ def fuzzy_find(needle, haystack):
     """
     s = difflib.SequenceMatcher(a=haystack, b=needle)
     best = s.find_longest_match(0, len(haystack), 0, len(needle))
+
     return best.a - len(needle) + best.size
@@ -1,4 +1,5 @@
 
+import ast
 import os
 from setuptools import setup, find_packages
 
@@ -8,16 +9,17 @@ __dir__ = os.path.dirname(__file__)
 with open(
     os.path.join(__dir__, "pycamv", "version.py")
 ) as f:
-    __version__ = "0.0.0"
-
-    for line in f:
-        if "#" in line:
-            line = line[:line.index("#")]
-
-        if not line.startswith("__version__ ="):
-            continue
-
-        __version__ = line.split("=")[1].strip().strip("\"")
+    __version__ = next(
+        (
+            ast.literal_eval(node.value)
+            for node in ast.parse(f.read()).body
+            if isinstance(node, ast.Assign) and any(
+                getattr(target, "id", None) == "__version__"
+                for target in node.targets
+            )
+        ),
+        "0.0.0",
+    )
 
 
 setup(
@@ -32,27 +34,28 @@ setup(
     author_email="morshed@mit.edu",
     license="BSD-2-Clause",
     packages=find_packages(exclude=["*.tests", "tests"]),
+    python_requires=">=3.6",
     install_requires=[
+        "numpy>=1.9",
         "numpydoc>=0.7",
         "openpyxl>=2.5.0",
         'pymzml @ http://github.com/naderm/pymzML/archive/master.zip',
         "requests>=2.18.4",
-        'backports.tempfile>=1.0 ; python_version<=\"2.7\"',
     ],
     extras_require={
         'matlab': [
             "scipy>=1.0.1",
         ],
+        'speedups': [
+            "numba>=0.49",
+        ],
     },
     classifiers=[
         "License :: OSI Approved :: BSD License",
         "Natural Language :: English",
         "Operating System :: OS Independent",
-        "Programming Language :: Python :: 2",
-        "Programming Language :: Python :: 2.7",
         "Programming Language :: Python :: 3",
-        "Programming Language :: Python :: 3.4",
-        "Programming Language :: Python :: 3.5",
+        "Programming Language :: Python :: 3 :: Only",
         "Programming Language :: Python :: 3.6",
         # "Programming Language :: Python :: Implementation :: PyPy",
         "Topic :: Scientific/Engineering",
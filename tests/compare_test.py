@@ -0,0 +1,58 @@
+from unittest import TestCase
+
+import numpy as np
+
+from pycamv.fragment import compare
+
+
+class DummySpectrum:
+    def __init__(self, peaks):
+        self.centroidedPeaks = peaks
+        self.i = [intensity for _, intensity in peaks]
+
+
+class CompareSpectraTest(TestCase):
+    def test_compare_spectra(self):
+        frag_ions = {
+            "b_{2}^{+}": 256.17680,
+            "b_{3}^{+}": 371.20374,
+            "y_{2}^{+}": 311.12376,
+            "y_{3}-H_2O^{+}": 371.20600,
+        }
+        spectrum = DummySpectrum([
+            (100.0, 5e4),
+            (256.17690, 1e5),
+            (311.10000, 8e4),
+            (371.20380, 6e4),
+        ])
+
+        peaks = compare.compare_spectra(
+            spectrum, frag_ions, tol=compare.HCD_TOL,
+        )
+
+        self.assertEqual(
+            [peak.mz for peak in peaks],
+            [mz for mz, _ in spectrum.centroidedPeaks],
+        )
+        self.assertEqual(
+            [peak.name for peak in peaks],
+            [None, "b_{2}^{+}", None, "b_{3}^{+}"],
+        )
+        self.assertEqual(
+            sorted(peaks[3].match_list),
+            ["b_{3}^{+}", "y_{3}-H_2O^{+}"],
+        )
+
+    def test_search_peaks(self):
+        frag_mzs = np.array([256.17680, 311.12376, 371.20374, 371.20600])
+        peak_mzs = np.array([100.0, 256.17690, 311.10000, 371.20380])
+        match_peaks = getattr(
+            compare._match_peaks, "py_func", compare._match_peaks,
+        )
+
+        for tol in [compare.HCD_TOL, compare.CID_TOL]:
+            starts, stops = compare._search_peaks(frag_mzs, peak_mzs, tol)
+            expected = match_peaks(frag_mzs, peak_mzs, tol)
+
+            self.assertEqual(starts.tolist(), expected[0].tolist())
+            self.assertEqual(stops.tolist(), expected[1].tolist())
@@ -1,13 +1,12 @@
 import os
+from queue import Queue
+import sqlite3
 import tempfile
+from types import SimpleNamespace
 from unittest import TestCase
 
-try:
-    from queue import Queue
-except ImportError:
-    from Queue import Queue
-
 from pycamv import export, fragment, scan, search
+from pycamv.export import sql
 
 
 class ExportTest(TestCase):
@@ -67,7 +66,7 @@ class ExportTest(TestCase):
             mh_peak,
         ]
         queue = Queue()
-        queue.put((
+        queue.put([(
             pep_query,
             (
                 ("N-term", ("TMT6plex",)),
@@ -85,7 +84,8 @@ class ExportTest(TestCase):
             peaks,
             [mh_peak],
             [mh_peak],
-        ))
+        )])
+        queue.put(export.export.SENTINEL)
         scan_mapping = {pep_query: scan_query}
 
         export.export.export_to_sql(
@@ -98,3 +98,89 @@ class ExportTest(TestCase):
             reprocess=True,
         )
         os.close(fd)
+
+    def test_id_cache_updates_rows(self):
+        cursor = sqlite3.connect(":memory:").cursor()
+        sql.create_tables(cursor)
+        id_cache = sql.IdCache()
+        ids = set()
+
+        # A repeated protein or peptide overwrites the values stored for it
+        for prot_desc, pep_offset in [("Old name", 1), ("New name", 5)]:
+            query = SimpleNamespace(
+                accessions=("Fgr",),
+                prot_descs=(prot_desc,),
+                uniprot_accessions=("P09769",),
+                full_seqs=("MGAYSLSIR",),
+                pep_seq="GAYSLSIR",
+                pep_offsets=(pep_offset,),
+            )
+            prot_set_id = sql.insert_protein_set(cursor, query)
+            ids.add((
+                tuple(sql.insert_protein(cursor, query, id_cache=id_cache)),
+                sql.insert_peptide(
+                    cursor, query, prot_set_id, id_cache=id_cache,
+                ),
+            ))
+
+        self.assertEqual(len(ids), 1)
+        self.assertEqual(
+            cursor.execute("SELECT protein_name FROM proteins").fetchall(),
+            [("New name",)],
+        )
+        self.assertEqual(
+            cursor.execute(
+                "SELECT protein_set_offsets FROM peptides"
+            ).fetchall(),
+            [("5",)],
+        )
+
+    def test_peaks_to_blob(self):
+        peaks = [(100.5, 1e4), (200.25, 5.0)]
+
+        self.assertEqual(sql._blob_to_peaks(sql._peaks_to_blob(peaks)), peaks)
+        self.assertEqual(sql._blob_to_peaks(sql._peaks_to_blob([])), [])
+
+    def test_migrate_text_blobs(self):
+        cursor = sqlite3.connect(":memory:").cursor()
+        sql.create_tables(cursor)
+        cursor.executescript(
+            """
+            PRAGMA foreign_keys = OFF;
+            UPDATE camv_meta SET val='1.1.0' WHERE key='camvDataVersion';
+
+            DROP TABLE scan_data;
+            CREATE TABLE scan_data
+            (
+                data_id     integer primary key autoincrement not null,
+                scan_id     integer not null,
+                data_type   text,
+                data_blob   blob,
+                UNIQUE(scan_id, data_type)
+            );
+            """
+        )
+        cursor.execute(
+            """
+            INSERT INTO scan_data (scan_id, data_type, data_blob)
+            VALUES (1, 'ms2', ?)
+            """,
+            [sqlite3.Binary(b"100.5,10000.0;200.25,5.0")],
+        )
+        cursor.execute(
+            """
+            INSERT INTO scan_data (scan_id, data_type, data_blob)
+            VALUES (2, 'ms2', NULL)
+            """
+        )
+
+        sql.run_migrations(cursor)
+
+        rows = cursor.execute(
+            "SELECT data_blob, data_encoding FROM scan_data ORDER BY scan_id"
+        ).fetchall()
+        self.assertEqual(
+            sql._blob_to_peaks(*rows[0]),
+            [(100.5, 1e4), (200.25, 5.0)],
+        )
+        self.assertEqual(rows[1], (None, None))
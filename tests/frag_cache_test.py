@@ -0,0 +1,103 @@
+import multiprocessing
+import os
+import tempfile
+from unittest import TestCase
+
+from pycamv.fragment import frag_cache, fragments, validate
+
+
+PEP_SEQ = (
+    ("N-term", ()),
+    ("S", ()),
+    ("V", ()),
+    ("Y", ("Phospho",)),
+    ("K", ()),
+    ("C-term", ()),
+)
+
+
+class FragCacheTest(TestCase):
+    def test_persistent_cache(self):
+        pep_seq = PEP_SEQ
+        key = (pep_seq, 2, None, None, 0)
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "fragments.db")
+
+            try:
+                cache = frag_cache.enable(path)
+                fragments._cached_fragment_ions.cache_clear()
+
+                frag_ions = fragments.fragment_ions(pep_seq, 2)
+
+                self.assertEqual(cache.get(key), frag_ions)
+
+                # Reopening the cache reads the ions back from disk
+                cache = frag_cache.enable(path)
+                fragments._cached_fragment_ions.cache_clear()
+
+                self.assertEqual(cache.get(key), frag_ions)
+                self.assertEqual(
+                    fragments.fragment_ions(pep_seq, 2), frag_ions,
+                )
+            finally:
+                frag_cache.disable()
+                fragments._cached_fragment_ions.cache_clear()
+
+    def test_schema_change(self):
+        key = (PEP_SEQ, 2, None, None, 0)
+        schema = frag_cache.FRAG_CACHE_SCHEMA
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "fragments.db")
+
+            cache = frag_cache.FragmentCache(path)
+            cache.put(key, [])
+            cache.close()
+
+            try:
+                # Caches written before fragment output changed are dropped
+                frag_cache.FRAG_CACHE_SCHEMA = schema + "-next"
+                cache = frag_cache.FragmentCache(path)
+
+                self.assertIsNone(cache.get(key))
+
+                cache.put(key, [])
+                cache.clear()
+
+                self.assertIsNone(cache.get(key))
+            finally:
+                cache.close()
+                frag_cache.FRAG_CACHE_SCHEMA = schema
+
+    def test_worker_cache(self):
+        key = (PEP_SEQ, 2, None, None, 0)
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "fragments.db")
+
+            # Spawned workers share nothing with this process, they must
+            # enable the cache themselves
+            pool = multiprocessing.get_context("spawn").Pool(
+                processes=1,
+                initializer=validate._init_worker,
+                initargs=({}, {}, {}, {}, False, True, path),
+            )
+
+            try:
+                frag_ions = pool.apply_async(
+                    fragments.fragment_ions, (PEP_SEQ, 2),
+                ).get(timeout=60)
+                pool.close()
+            finally:
+                pool.terminate()
+                pool.join()
+
+            self.assertIsNone(frag_cache.get_cache())
+
+            cache = frag_cache.FragmentCache(path)
+
+            try:
+                self.assertEqual(cache.get(key), frag_ions)
+            finally:
+                cache.close()
@@ -230,8 +230,13 @@ class FragmentIonsTest(TestCase):
             )
 
             for name, mz in hits.items():
-                self.assertIn(name, frag_ions)
-                self.assertLess(abs(frag_ions[name] - mz), 0.01)
+                with self.subTest(
+                    pep_seq=fragments._sequence_name(pep_seq),
+                    charge=charge,
+                    ion=name,
+                ):
+                    self.assertIn(name, frag_ions)
+                    self.assertLess(abs(frag_ions[name] - mz), 0.01)
 
     def test_no_by_losses(self):
         frag_ions = fragments.fragment_ions(
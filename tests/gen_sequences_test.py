@@ -13,7 +13,7 @@ class GenSequencesTest(TestCase):
         )
         self.assertEqual(len(seqs), 2)
         self.assertIn(
-            [
+            (
                 ("N-term", ()),
                 ("I", ()),
                 ("E", ()),
@@ -23,11 +23,11 @@ class GenSequencesTest(TestCase):
                 ("E", ()),
                 ("R", ()),
                 ("C-term", ()),
-            ],
+            ),
             seqs,
         )
         self.assertIn(
-            [
+            (
                 ("N-term", ()),
                 ("I", ()),
                 ("E", ()),
@@ -37,6 +37,16 @@ class GenSequencesTest(TestCase):
                 ("E", ()),
                 ("R", ()),
                 ("C-term", ()),
-            ],
+            ),
             seqs,
         )
+
+    def test_gen_possible_seq_limit(self):
+        seqs = list(
+            gen_sequences.gen_possible_seq(
+                "IEFTTER",
+                [(1, "Phospho", ["T"])],
+                limit=1,
+            )
+        )
+        self.assertEqual(len(seqs), 1)
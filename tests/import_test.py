@@ -1,22 +1,34 @@
+import importlib
 from unittest import TestCase
 
+MODULES = [
+    "pycamv.main",
+    "pycamv.proteowizard",
+    "pycamv.regexes",
+    "pycamv.utils",
+    "pycamv.version",
+    "pycamv.camv_mat",
+    "pycamv.export.export",
+    "pycamv.export.migrations",
+    "pycamv.export.sql",
+    "pycamv.fragment.compare",
+    "pycamv.fragment.frag_cache",
+    "pycamv.fragment.fragments",
+    "pycamv.fragment.gen_sequences",
+    "pycamv.fragment.losses",
+    "pycamv.fragment.masses",
+    "pycamv.fragment.ms_labels",
+    "pycamv.fragment.validate",
+    "pycamv.scan.scan_list",
+    "pycamv.scan.scans",
+    "pycamv.search.discoverer",
+    "pycamv.search.pep_query",
+    "pycamv.search.search",
+]
+
 
 class ImportTest(TestCase):
     def test_imports(self):
-        from pycamv import (
-            main, proteowizard, regexes, utils, version,
-        )
-        from pycamv import camv_mat
-        from pycamv.export import (
-            export, migrations, sql,
-        )
-        from pycamv.fragment import (
-            compare, fragments, gen_sequences, losses, masses, ms_labels,
-            validate,
-        )
-        from pycamv.scan import (
-            scan_list, scans,
-        )
-        from pycamv.search import (
-            discoverer, pep_query, search,
-        )
+        for name in MODULES:
+            with self.subTest(module=name):
+                importlib.import_module(name)
@@ -5,10 +5,11 @@ from pycamv.fragment import ms_labels
 
 class MSLabelsTest(TestCase):
     def test_labels(self):
-        for key in ms_labels.LABEL_NUMBERS.keys():
-            self.assertIn(key, ms_labels.LABEL_MZ_WINDOW)
-            self.assertIn(key, ms_labels.LABEL_MASSES)
-            self.assertIn(key, ms_labels.LABEL_NAMES)
+        labels = set(ms_labels.LABEL_NUMBERS)
+
+        self.assertLessEqual(labels, set(ms_labels.LABEL_MZ_WINDOW))
+        self.assertLessEqual(labels, set(ms_labels.LABEL_MASSES))
+        self.assertLessEqual(labels, set(ms_labels.LABEL_NAMES))
 
         for key, val in ms_labels.LABEL_MASSES.items():
             self.assertLess(ms_labels.LABEL_MZ_WINDOW[key][0], min(val))
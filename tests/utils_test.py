@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+import difflib
+import random
+from unittest import TestCase
+
+from pycamv import utils
+
+
+class UtilsTest(TestCase):
+    def test_rewrite_ion_name(self):
+        for name, display_name in [
+            ("b_{3}^{+}", u"b₃"),
+            ("b_{3}-HPO_3^{+}", u"b₃-HPO₃"),
+            ("y_{6}^{+2}", u"y₆⁺²"),
+            ("a_{4}-H_3PO_4^{+2}", u"a₄-H₃PO₄⁺²"),
+            ("MH+2 ^{13}C^{+3}", u"MH+2 ¹³C⁺³"),
+            ("MH-H_2O^{+}", u"MH-H₂O⁺"),
+            ("pY", u"pY"),
+        ]:
+            self.assertEqual(utils.rewrite_ion_name(name), display_name)
+
+    def test_fuzzy_find(self):
+        def _difflib_find(needle, haystack):
+            best = difflib.SequenceMatcher(
+                a=haystack, b=needle,
+            ).find_longest_match(0, len(haystack), 0, len(needle))
+            return best.a - len(needle) + best.size
+
+        self.assertEqual(utils.fuzzy_find("ABCDEFG", "ABCDXXXXABCDEFG"), 8)
+        self.assertEqual(utils.fuzzy_find("ABCDEFG", "XXABCDEYYY"), 0)
+
+        rand = random.Random(0)
+        letters = "ACDEFGHIKLMNPQRSTVWY"
+
+        for _ in range(500):
+            haystack = "".join(rand.choice(letters) for _ in range(150))
+            start = rand.randrange(0, 140)
+            needle = haystack[start:start + rand.randint(5, 20)]
+
+            # Mutate some needles so the longest common substring is used
+            if rand.random() < 0.5:
+                index = rand.randrange(len(needle))
+                needle = needle[:index] + "X" + needle[index + 1:]
+
+            self.assertEqual(
+                utils.fuzzy_find(needle, haystack),
+                _difflib_find(needle, haystack),
+                (needle, haystack),
+            )
+
+    def test_fuzzy_find_cached(self):
+        utils.fuzzy_find.cache_clear()
+
+        for _ in range(2):
+            self.assertEqual(
+                utils.fuzzy_find("ABCDEFG", "ABCDXXXXABCDEFG"), 8,
+            )
+            self.assertEqual(utils.fuzzy_find("ABCDEFG", "XXABCDEYYY"), 0)
+
+        self.assertEqual(utils.fuzzy_find.cache_info().hits, 2)
@@ -1,17 +1,23 @@
+from concurrent.futures import ThreadPoolExecutor
 import hashlib
 import logging
 import os
 import requests
+import shutil
 import tempfile
 from unittest import TestCase
 
-try:
-    tempfile.TemporaryDirectory
-except AttributeError:
-    from backports import tempfile
-
 from pycamv import search, main
 
+# Hash and write downloads in 1 MiB blocks
+BLOCK_SIZE = 1 << 20
+
+# Downloaded fixtures are kept here between runs, under their md5 hash
+FIXTURE_CACHE_DIR = os.environ.get(
+    "PYCAMV_TEST_CACHE",
+    os.path.join(os.path.expanduser("~"), ".cache", "pycamv-tests"),
+)
+
 PD_URL_BASE = (
     "https://media.githubusercontent.com/media/"
     "white-lab/pycamverter-data/master/"
@@ -87,43 +93,78 @@ PD22_RAWS = {
 
 
 class ValidateTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        # Reuse connections between fixture downloads
+        cls.session = requests.Session()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.session.close()
+
     def fetch_url(self, url, dir, md5hash=None):
-        logging.info('Downloading {} to {}'.format(url, dir))
-        response = requests.get(url, stream=True)
         path = os.path.join(dir, url.split('/')[-1])
         path = os.path.splitext(path)[0] + os.path.splitext(path)[1].lower()
-        hash_md5 = hashlib.md5()
+        cache_path = os.path.join(
+            FIXTURE_CACHE_DIR, md5hash, os.path.basename(path),
+        ) if md5hash is not None else None
 
-        with open(path, 'wb') as f:
-            for block in response.iter_content(1024):
-                hash_md5.update(block)
-                f.write(block)
+        if cache_path is not None and os.path.exists(cache_path):
+            logging.info('Copying cached {} to {}'.format(url, dir))
+
+            with open(cache_path, 'rb') as f:
+                hexdigest = self._write_blocks(
+                    iter(lambda: f.read(BLOCK_SIZE), b''),
+                    path,
+                )
+        else:
+            logging.info('Downloading {} to {}'.format(url, dir))
+            response = self.session.get(url, stream=True)
+            hexdigest = self._write_blocks(
+                response.iter_content(BLOCK_SIZE),
+                path,
+            )
 
-        if md5hash is not None and hash_md5.hexdigest() != md5hash:
+        if md5hash is not None and hexdigest != md5hash:
             raise Exception(
                 "MD5 hash of {} does not match record: {} != {}"
-                .format(url, md5hash, hash_md5.hexdigest())
+                .format(url, md5hash, hexdigest)
             )
 
+        if cache_path is not None and not os.path.exists(cache_path):
+            # Copy then rename, so that an interrupted run never leaves a
+            # partial file in the cache
+            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(cache_path))
+            os.close(fd)
+            shutil.copyfile(path, tmp_path)
+            os.replace(tmp_path, cache_path)
+
         return path
 
+    def _write_blocks(self, blocks, path):
+        hash_md5 = hashlib.md5()
+
+        with open(path, 'wb') as f:
+            for block in blocks:
+                hash_md5.update(block)
+                f.write(block)
+
+        return hash_md5.hexdigest()
+
     def _validate_pd(self, url_base, url, md5, scans, raws):
         with tempfile.TemporaryDirectory() as tmp_dir:
             print(url, md5, tmp_dir)
 
-            search_path = self.fetch_url(
-                url_base + url,
-                tmp_dir,
-                md5hash=md5,
-            )
-            raw_paths = [
-                self.fetch_url(
-                    url_base + raw,
-                    tmp_dir,
-                    md5hash=md5,
+            # Download the search and raw files concurrently
+            with ThreadPoolExecutor(max_workers=4) as executor:
+                search_path, *raw_paths = executor.map(
+                    lambda job: self.fetch_url(*job),
+                    [(url_base + url, tmp_dir, md5)] + [
+                        (url_base + raw, tmp_dir, raw_md5)
+                        for raw, raw_md5 in raws
+                    ],
                 )
-                for raw, md5 in raws
-            ]
             main.main(
                 [search_path] +
                 [i for i in raw_paths] +